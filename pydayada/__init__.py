@@ -1,3 +1,3 @@
-from .pydayada import dayada, lang
+from .pydayada import dayada, lang, main
 
 __version__ = "0.1.0"
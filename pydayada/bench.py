@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import json
+import random
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from .pydayada import dayada, encoder, bitreader, has_aes, has_numpy
+
+sizes = (16, 256, 4096, 65536, 1048576, 4194304)
+kinds = ("random", "repetitive")
+password = b"benchmark"
+# the import and first encode of a fresh interpreter, which every console run pays,
+# should take less than this many seconds
+startup_target = .05
+
+def payload(kind, size):
+    if kind == "random":
+        return random.Random(size).randbytes(size)
+    text = b"All work and no play makes Jack a dull boy. "
+    return (text * (size // len(text) + 1))[:size]
+
+def syllables(lang, data):
+    # counted on a bare encoder, outside of the timed runs
+    enc = encoder(lang, bitreader(data))
+    for word in enc.words():
+        pass
+    return enc.counts()["syllables"]
+
+def measure(fn, arg, min_time):
+    # the best of as many runs as fit in min_time, at least one
+    best = float("inf")
+    total = 0
+    while total < min_time or best == float("inf"):
+        start = time.perf_counter()
+        fn(arg)
+        spent = time.perf_counter() - start
+        best = min(best, spent)
+        total += spent
+    return best
+
+def peak(fn, arg):
+    tracemalloc.start()
+    try:
+        fn(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def ops(d, lang):
+    # name, function and the payload each operation works on: the data or its text
+    out = [
+        ("encode", lambda data: d.encode(data, lang = lang), "data"),
+        ("decode", lambda text: d.decodebytes(text, lang = lang), "text"),
+        ("iterencode", lambda data: "".join(d.iterencode([data], lang = lang)), "data"),
+        ("iterdecode", lambda text: sum(len(b) for b in d.iterdecode([text], lang = lang)), "text")
+    ]
+    if has_aes:
+        out.append(("encrypt", lambda data: d.encrypt(password, data, lang = lang), "data"))
+        out.append(("decrypt", lambda text: d.decrypt(password, text, lang = lang), "ctext"))
+    return out
+
+def startup(runs = 10):
+    # the median over runs fresh interpreters of the time to import pydayada and encode
+    # a short message, and of the time the whole process took
+    code = "import time; t = time.perf_counter(); import pydayada; pydayada.dayada().encode(b'hello'); print(time.perf_counter() - t)"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+    inside = []
+    total = []
+    for i in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], env = env, capture_output = True, text = True, check = True).stdout
+        total.append(time.perf_counter() - start)
+        inside.append(float(out))
+    return {"import_encode_s": statistics.median(inside), "process_s": statistics.median(total), "target_s": startup_target}
+
+def run(langs = None, sizes = sizes, kinds = kinds, memory = True, min_time = .2, startup_runs = 10):
+    # measures every operation for every language, payload kind and size, and the
+    # startup time, and returns the results, ready to be dumped as JSON
+    from . import __version__
+    d = dayada()
+    results = []
+    for name in langs or d.get_langs():
+        lang = d.get_lang(name)
+        for kind in kinds:
+            for size in sizes:
+                data = payload(kind, size)
+                inputs = {"data": data, "text": d.encode(data, lang = lang)}
+                if has_aes:
+                    inputs["ctext"] = d.encrypt(password, data, lang = lang)
+                syls = syllables(lang, data)
+                for op, fn, arg in ops(d, lang):
+                    seconds = measure(fn, inputs[arg], min_time)
+                    result = {
+                        "op": op, "lang": name, "kind": kind, "size": size,
+                        "seconds": seconds,
+                        "bytes_per_s": size / seconds,
+                        "syllables_per_s": syls / seconds
+                    }
+                    if memory:
+                        result["peak_bytes"] = peak(fn, inputs[arg])
+                    results.append(result)
+    report = {"version": __version__, "python": platform.python_version(), "numpy": has_numpy, "results": results}
+    if startup_runs:
+        report["startup"] = startup(startup_runs)
+    return report
+
+def compare(report, baseline = None, tolerance = .25):
+    # the results that got slower, or use more memory, than in baseline by more than
+    # tolerance, and the startup time if it is over its target. Results missing from
+    # either side are skipped
+    regressions = []
+    s = report.get("startup")
+    if s:
+        limits = [s["target_s"]]
+        if baseline and "startup" in baseline:
+            limits.append(baseline["startup"]["import_encode_s"] * (1 + tolerance))
+        if s["import_encode_s"] > min(limits):
+            regressions.append({"op": "startup", "field": "import_encode_s", "baseline": min(limits), "value": s["import_encode_s"], "factor": s["import_encode_s"] / min(limits)})
+    if not baseline:
+        return regressions
+    key = lambda r: (r["op"], r["lang"], r["kind"], r["size"])
+    base = {key(r): r for r in baseline["results"]}
+    for r in report["results"]:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        factors = {"bytes_per_s": b["bytes_per_s"] / r["bytes_per_s"]}
+        # a few kilobytes more don't count, they are noise for the small payloads
+        if "peak_bytes" in r and "peak_bytes" in b and r["peak_bytes"] - b["peak_bytes"] > 65536:
+            factors["peak_bytes"] = r["peak_bytes"] / max(b["peak_bytes"], 1)
+        for field, factor in factors.items():
+            if factor > 1 + tolerance:
+                regressions.append({"op": r["op"], "lang": r["lang"], "kind": r["kind"], "size": r["size"], "field": field, "baseline": b[field], "value": r[field], "factor": factor})
+    return regressions
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(prog = "pydayada bench")
+    parser.add_argument('-l', '--langs', nargs='+')
+    parser.add_argument('-s', '--sizes', nargs='+', type=int, default=sizes)
+    parser.add_argument('-k', '--kinds', nargs='+', choices=kinds, default=kinds)
+    parser.add_argument('-b', '--baseline') # a report written by an earlier run
+    parser.add_argument('-t', '--tolerance', type=float, default=.25)
+    parser.add_argument('-o', '--output') # the default output is stdout
+    parser.add_argument('--min-time', type=float, default=.2)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--startup-runs', type=int, default=10) # 0 skips the startup time
+    o = parser.parse_args(argv)
+
+    report = run(o.langs, o.sizes, o.kinds, not o.no_memory, o.min_time, o.startup_runs)
+    baseline = None
+    if o.baseline:
+        with open(o.baseline) as f:
+            baseline = json.load(f)
+    report["regressions"] = compare(report, baseline, o.tolerance)
+    out = json.dumps(report, indent = 2)
+    if o.output:
+        with open(o.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+    return 1 if report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,278 @@
 import re
 import math
 import random
-has_crypto = True
-try:
-    import simplecrypto
-except:
-    has_crypto = False
+import time
+import importlib.util
+import os
+import mmap
+import codecs
 import logging
+from collections import deque, namedtuple, Counter, OrderedDict
+from itertools import islice, chain
 from base64 import b64encode, b64decode
-from binascii import hexlify, unhexlify
+from binascii import unhexlify
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
+# simplecrypto pulls in pycryptodome, so it is only imported by crypto(), the first
+# time something is encrypted or decrypted with it. The same goes for pycryptodome
+# itself and the modules only some features need, which are imported where used
+has_crypto = importlib.util.find_spec("simplecrypto") is not None
+has_aes = importlib.util.find_spec("Crypto") is not None
+has_numpy = importlib.util.find_spec("numpy") is not None
+simplecrypto = None
+
+def crypto():
+    global simplecrypto
+    if simplecrypto is None:
+        import simplecrypto
+    return simplecrypto
+
+# one step of the assembly: the syllable it belongs to, the offset of its bits in the
+# binary data, the bits themselves as a '0'/'1' string and what they stand for
+traceevent = namedtuple("traceevent", ["syllable", "offset", "bits", "part"])
+
+# a decoded frame of framed text: its sequence number, the offset of its data in the
+# whole payload, the frame size and whether it is the last one
+frame = namedtuple("frame", ["seq", "offset", "size", "last", "data"])
+
+# what a language writes per byte of random data, in characters and in UTF-8 bytes,
+# worked out from its tables and, unless skipped, measured on an encoded payload.
+# Along with whether its text is ASCII and how long its longest word can be
+density = namedtuple("density", ["lang", "chars", "utf8", "measured_chars", "measured_utf8", "ascii", "max_word"])
+
+# a passage of Dayada text found by scanner: the offsets of its first letter and past
+# its last one, its language and the data it decodes to, None if it was too long to
+# be held
+passage = namedtuple("passage", ["start", "end", "lang", "data"])
+
+# the size of the text a payload encodes to: its words, marker included, and the
+# fewest and most characters and UTF-8 bytes the punctuation can make it. With a seed
+# set, the least and the most are the same
+prediction = namedtuple("prediction", ["words", "min_chars", "max_chars", "min_utf8", "max_utf8"])
+
+# the basic GSM 03.38 alphabet, in which an SMS holds 160 characters; texts with
+# any other character are sent in UCS-2, 70 characters to an SMS
+gsm7 = "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+
+def tobits(num, l):
+    # num as a '0'/'1' string of l digits, for traces
+    return format(num, "b").zfill(l) if l > 0 else ""
+
+def readchunks(source, size = 65536):
+    # bytes-like objects, mmaps included, are sliced into memoryviews of size bytes
+    # without copying, file objects are read size units at a time, anything else is
+    # taken as an iterable of chunks
+    try:
+        view = memoryview(source)
+    except TypeError:
+        view = None
+    if view is not None:
+        for i in range(0, len(view), size):
+            yield view[i:i + size]
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+def convertchunks(chunks, format):
+    # turns chunks of hex or base64 text into bytes as they come, ignoring whitespace.
+    # Chunks in other formats are passed on as they are
+    if format not in ("hex", "base64"):
+        yield from chunks
+        return
+    group = 2 if format == "hex" else 4
+    rest = b""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("ascii")
+        chunk = rest + bytes(chunk).translate(None, b" \t\r\n")
+        cut = len(chunk) - len(chunk) % group
+        rest = chunk[cut:]
+        if cut:
+            yield unhexlify(chunk[:cut]) if format == "hex" else b64decode(chunk[:cut])
+    if rest:
+        yield unhexlify(rest) if format == "hex" else b64decode(rest)
+
+def paragraphs(chunks):
+    # splits chunks of text, bytes being taken as UTF-8, at blank lines and yields the
+    # paragraphs that aren't empty
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    held = ""
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        parts = re.split("\n[ \t\r]*\n", held + chunk)
+        held = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+    held += decoder.decode(b"", True)
+    if held.strip():
+        yield held.strip()
+
+# compression codecs by name: the byte tagging data compressed by them, followed by
+# the start of the streams they write
+compressions = {
+    "zlib": (0xd1, b"\x78\xda"),
+    "bz2": (0xd2, b"BZh9"),
+    "lzma": (0xd3, b"\xfd7zXZ\x00")
+}
+
+def compressor(codec):
+    if codec == "zlib":
+        import zlib
+        return zlib.compressobj(9)
+    elif codec == "bz2":
+        import bz2
+        return bz2.BZ2Compressor(9)
+    elif codec == "lzma":
+        import lzma
+        return lzma.LZMACompressor()
+    raise Exception("Unknown compression {}".format(codec))
+
+def decompressor(codec):
+    if codec == "zlib":
+        import zlib
+        return zlib.decompressobj()
+    elif codec == "bz2":
+        import bz2
+        return bz2.BZ2Decompressor()
+    import lzma
+    return lzma.LZMADecompressor()
+
+def detect(data):
+    # the codec data looks compressed by, or None
+    for codec, (tag, magic) in compressions.items():
+        if data[:1] == bytes([tag]) and data[1:1 + len(magic)] == magic:
+            return codec
+    return None
+
+def compress(data, codec):
+    # data compressed by codec, with its tag in front. With "auto", the smallest of
+    # all codecs, or data as it is if none makes it smaller and it doesn't look
+    # compressed, see compressed()
+    if codec != "auto":
+        c = compressor(codec)
+        return bytes([compressions[codec][0]]) + c.compress(data) + c.flush()
+    best = data if detect(data) is None else None
+    # tiny inputs gain nothing, and what zlib can't shrink the others can't either
+    if len(data) >= 64 or best is None:
+        for codec in compressions:
+            out = compress(data, codec)
+            if best is None or len(out) < len(best):
+                best = out
+            elif codec == "zlib":
+                break
+    return best
+
+def compressed(data, codec):
+    # data as it is encoded: compressed by codec, or None for as it is. Data that
+    # only looks compressed would be taken for compressed data by decompress(), so
+    # it is compressed with zlib whatever the codec
+    if codec or detect(data) is not None:
+        return compress(data, codec or "zlib")
+    return data
+
+def decompress(data):
+    # data decompressed if it is tagged, else as it is. Tagged data has to be whole,
+    # as in decompresschunks()
+    codec = detect(data)
+    if codec is None:
+        return data
+    d = decompressor(codec)
+    try:
+        out = d.decompress(bytes(data[1:]))
+    except Exception:
+        raise Exception("Compressed data is corrupted")
+    if not d.eof:
+        raise Exception("Compressed data is truncated")
+    if d.unused_data:
+        raise Exception("Compressed data is corrupted")
+    return out
+
+def compresschunks(chunks, codec, sample = 1048576):
+    # the streaming counterpart of compressed(). With "auto", the codec is picked on
+    # the first sample bytes
+    chunks = iter(chunks)
+    if not codec:
+        head = bytearray()
+        for chunk in chunks:
+            head += chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            if len(head) > 8:
+                break
+        if detect(head) is None:
+            if head:
+                yield bytes(head)
+            yield from chunks
+            return
+        codec = "zlib"
+        chunks = chain([head], chunks)
+    if codec == "auto":
+        head = bytearray()
+        for chunk in chunks:
+            head += chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            if len(head) >= sample:
+                break
+        else:
+            yield compress(bytes(head), "auto")
+            return
+        codec = detect(compress(bytes(head), "auto"))
+        if codec is None:
+            yield head
+            yield from chunks
+            return
+        chunks = chain([head], chunks)
+    c = compressor(codec)
+    yield bytes([compressions[codec][0]])
+    for chunk in chunks:
+        yield c.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    yield c.flush()
+
+def decompresschunks(chunks):
+    # the streaming counterpart of decompress(): a stream that starts like compressed
+    # data is decompressed as it comes, and has to be whole
+    chunks = iter(chunks)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) > 8:
+            break
+    codec = detect(head)
+    if codec is None:
+        if head:
+            yield bytes(head)
+        yield from chunks
+        return
+    d = decompressor(codec)
+    for chunk in chain([head[1:]], chunks):
+        try:
+            out = d.decompress(bytes(chunk))
+        except Exception:
+            raise Exception("Compressed data is corrupted")
+        if out:
+            yield out
+    if not d.eof:
+        raise Exception("Compressed data is truncated")
+    if d.unused_data:
+        raise Exception("Compressed data is corrupted")
+
 class lang:
+    # a "language" along with everything the codec derives from it, computed once.
+    # Instances are shared by all dayada instances and threads, so they are frozen
+    __slots__ = (
+        "name", "consonants", "matches", "vowels", "initials", "finals", "termination",
+        "syl_max_len", "marker", "consonants_len", "vowels_len", "vowel_pattern", "finals_len",
+        "initials_len", "max_syl", "core_len", "exp2_syl", "allchars", "strip_pattern",
+        "syllables", "matched", "codes", "consonant_tokens", "match_tokens", "vowel_tokens",
+        "initial_tokens", "final_tokens", "termination_tokens", "space_tokens", "frozen"
+    )
+
     def __init__(self, name, consonants, matches, vowels, initials, finals, termination, syl_max_len, marker):
         # start with sanity checks
         if len(matches) != 0 and len(consonants) != len(matches):
@@ -25,446 +284,2506 @@ class lang:
         if not lang.ispower2(len(finals)):
             raise Exception("Finals have to be a power of 2")
         self.name = name
-        self.consonants = consonants
-        self.matches = matches
-        self.vowels = vowels
-        self.initials = initials
-        self.finals = finals
+        self.consonants = tuple(consonants)
+        self.matches = tuple(matches)
+        self.vowels = tuple(vowels)
+        self.initials = tuple(initials)
+        self.finals = tuple(finals)
         self.termination = termination
         self.syl_max_len = syl_max_len
         self.marker = marker
-
-    def ispower2(num):
-        if num < 0:
-            return False
-        if num == 0:
-            return True
-        if num != math.pow(2, math.log2(num)):
-            return False
-        return True
-        
-class dayada:
-    def __init__(self):
-        self.langs = [ 
-            lang( 
-                "en", 
-                ["B", "C", "D", "F", "G", "H", "J", "K", "L", "M", "N", "P", "R", "S", "T", "V", "W", "X", "Z", "BL", "BR", "CH", "CR", "CL", "DR", "FL", "GL", "GN", "GR", "KN", "PH", "PL", "PR", "RH", "ST", "SP", "SH", "WH", "TH", "TR", "WR", "STR", "SHR"], 
-                ["R", "N", "S", "L", "N", "M", "L", "P", "S", "R", "S", "L", "N", "M", "R", "N", "H", "N", "M", "N",  "S",  "M",  "L",  "S",  "N",  "S",  "D",  "S",  "N",  "S",  "L",  "N",  "N",  "S",  "N",  "N",  "M",  "T",  "N",  "M",  "S",   "N",   "L"], 
-                ["A", "E", "I", "O", "U", "AE", "AI", "AY", "EE", "OO", "OU", "AU"], 
-                ["A", "E", "I", "O", "U", "EU", "AI", "YO"], 
-                ["R", "S", "T", "N", "RD", "ST", "NT", "NG"], 
-                "SZ", 
-                3, 
-                "YA DAYADA" 
-            ), 
-            lang( 
-                "jp", 
-                ["",  "K", "S", "T", "H", "M", "Y", "R", "W"], 
-                ["N",  "N", "N", "N", "N", "N", "N", "N", "N"], 
-                ["A", "I", "U", "E", "O"], 
-                [ ], 
-                [ ], 
-                "X", 
-                3, 
-                "YA TAYATA" 
-            ), 
-            lang( 
-                "it", 
-                ["B", "C", "D", "F", "G", "L", "M", "N", "P", "R", "S", "T", "V", "Z", "BR", "CR", "CL", "FL", "FR", "GR", "PL", "PR", "SC", "ST", "SP", "TR", "STR"], 
-                ["R", "C", "D", "F", "N", "B", "L", "G", "P", "R", "S", "T", "N", "Z", "N",  "S",  "N",  "F",  "R",  "N",  "S",  "M",  "N",  "R",  "L",  "L",  "S"], 
-                ["A", "E", "I", "O", "U", "AI", "AU"], 
-                ["A", "E", "I", "O", "U", "EU", "AU", "AI"], 
-                [ ], 
-                "SZ", 
-                2, 
-                "ITA LIANO" 
-            ), 
-            lang( 
-                "hi", 
-                ["",  "H", "K", "L", "M", "N", "P", "W", "ʻ"], 
-                [], 
-                ["A", "E", "I", "O", "U", "Ā", "Ē", "Ī", "Ō", "Ū"], 
-                [], 
-                [], 
-                "X", 
-                5, 
-                "KA MAʻAINA" 
-            ) 
-        ] 
-        self.puncts = [
-            [5, ", ", 8, ". ", 5, ', "', 6, '." '],
-            [6, ", ", 5, ", ", 7, ". "]
-        ];
-        self.marker = True
-        self.lang = None
-        self.reset()
-        
-    def guess_lang(self, text):
-        text = text.upper()
-        text = re.sub("[-'`~!@#$%^&*()_|+=?;:'\",.<>\{\}\[\]\\\/]", '', text)
-        for lang in self.langs:
-            if lang.marker in text:
-                return lang
-            
-    def find_language(self, name):
-        for lang in self.langs:
-            if lang.name == name:
-                return lang
-        return None
-    
-    def get_langs(self):
-        return [lang.name for lang in self.langs]
-
-    def set_default_lang(self):
-        self.set_lang(self.get_langs()[0])
-    
-    def set_lang(self, lang):
-        if isinstance(lang, str):
-            lang = self.find_language(lang)
-        if not lang:
-            return
-        self.lang = lang
-        self.consonants_len = len(self.lang.consonants)
-        self.vowels_len = len(self.lang.vowels)
-        self.vowel_re = re.compile("[{}]+".format("".join(self.lang.vowels)), re.IGNORECASE)
-        self.finals_len = self.get_power(self.lang.finals)
-        self.initials_len = self.get_power(self.lang.initials)
+        self.consonants_len = len(consonants)
+        self.vowels_len = len(vowels)
+        self.vowel_pattern = "[{}]+".format(re.escape("".join(vowels)))
+        self.finals_len = lang.get_power(finals)
+        self.initials_len = lang.get_power(initials)
         self.max_syl = self.consonants_len * self.vowels_len
-        self.syl_max_len = self.lang.syl_max_len
         self.core_len = math.floor(math.log2(self.max_syl))
         self.exp2_syl = int(math.pow(2, self.core_len))
-        self.allchars = "".join(set(self.lang.consonants + self.lang.matches + self.lang.vowels + self.lang.initials + self.lang.finals + list(self.lang.marker)))
-        
-    def get_power(self, l):
+        self.allchars = "".join(sorted(set("".join(self.consonants + self.matches + self.vowels + self.initials + self.finals) + marker)))
+        self.strip_pattern = "[^" + re.escape(self.allchars) + "]"
+        # the text of every syllable code, plain and with its consonantal match
+        self.syllables = tuple(self.consonants[num % self.consonants_len] + self.vowels[num // self.consonants_len] for num in range(self.max_syl))
+        self.matched = tuple(self.matches[num % self.consonants_len] + syl for num, syl in enumerate(self.syllables)) if matches else ()
+        # and back: the core bits and the excess bit, or -1 for none, of each code
+        self.codes = tuple((num - self.exp2_syl, 1) if num >= self.exp2_syl else (num, 0 if num + self.exp2_syl < self.max_syl else -1) for num in range(self.max_syl))
+        self.consonant_tokens = lang.token_table(consonants)
+        self.match_tokens = lang.token_table(matches)
+        self.vowel_tokens = lang.token_table(vowels)
+        self.initial_tokens = lang.token_table(initials)
+        self.final_tokens = lang.token_table(finals)
+        self.termination_tokens = lang.token_table([termination])
+        self.space_tokens = lang.token_table([" "])
+        self.frozen = True
+
+    # the regexes are compiled on first use, and then found in the cache of re, so
+    # languages that are loaded but not used cost nothing to compile
+    @property
+    def vowel_re(self):
+        return re.compile(self.vowel_pattern, re.IGNORECASE)
+
+    @property
+    def strip_re(self):
+        return re.compile(self.strip_pattern, re.IGNORECASE)
+
+    def __reduce__(self):
+        # pickled along with its tables, so that other processes and the language cache
+        # don't have to build them again
+        return (lang.compiled, (tuple(getattr(self, k) for k in lang.__slots__[:-1]),))
+
+    def compiled(state):
+        self = object.__new__(lang)
+        for k, v in zip(lang.__slots__[:-1], state):
+            object.__setattr__(self, k, v)
+        object.__setattr__(self, "frozen", True)
+        return self
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise AttributeError("Language {} is shared and cannot be changed".format(self.name))
+        object.__setattr__(self, name, value)
+
+    def ispower2(num):
+        return num >= 0 and num & (num - 1) == 0
+
+    def get_power(l):
         if len(l) == 0:
             return -1
         return math.ceil(math.log2(len(l)))
-    
-    def reset(self):
+
+    def token_table(l):
+        # maps each token to its highest index in l, so that at any position the token
+        # listed last wins, which for all languages is also the longest one
+        tokens = {}
+        for i, t in enumerate(l):
+            tokens[t] = i
+        return tokens, sorted(set(len(t) for t in tokens))
+
+class bitreader:
+    # reads big-endian bit fields off a bytes-like buffer with a bit cursor. Once the
+    # last data byte is loaded, a run of pad_len bits opposite to the last data bit is
+    # appended so that the decoder can find the end of the data again
+    pad_len = 22
+
+    def __init__(self, data, nbits = None):
+        self.data = data
+        self.nbits = len(data) * 8 if nbits is None else nbits
+        self.nbytes = (self.nbits + 7) // 8
+        self.next = 0
+        self.acc = 0
+        self.acc_len = 0
+        self.pos = 0
+
+    def exhausted(self):
+        return self.pos >= self.nbits
+
+    def read(self, b):
+        while self.acc_len < b and self.next < self.nbytes:
+            self.acc = (self.acc << 8) | self.data[self.next]
+            self.acc_len += 8
+            self.next += 1
+            if self.next == self.nbytes:
+                self.more()
+        # past the padding, only the bits still available are returned
+        k = min(b, self.acc_len)
+        self.acc_len -= k
+        self.pos += k
+        out = self.acc >> self.acc_len
+        self.acc &= (1 << self.acc_len) - 1
+        return out, k
+
+    def more(self):
+        # the last data byte is loaded: drop the bits past nbits and append the padding
+        extra = -self.nbits % 8
+        self.acc >>= extra
+        self.acc_len -= extra
+        pad = 0 if self.acc & 1 else (1 << self.pad_len) - 1
+        self.acc = (self.acc << self.pad_len) | pad
+        self.acc_len += self.pad_len
+
+class bitstream(bitreader):
+    # a bitreader pulling its data from an iterable of bytes or str chunks, str being
+    # taken as UTF-8. The next chunk is only fetched once the last byte of the current
+    # one is loaded, so the total length is known just in time for the padding
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        bitreader.__init__(self, b"", 0)
+        self.loaded = 0
+        self.nbits = math.inf
+        self.more()
+
+    def more(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if len(chunk) > 0:
+                self.data = chunk
+                self.next = 0
+                self.nbytes = len(chunk)
+                self.loaded += 8 * len(chunk)
+                return
+        self.nbits = self.loaded
+        if self.acc_len > 0:
+            bitreader.more(self)
+
+class bitwriter:
+    # packs bits into a growable bytearray, a nibble at a time. For both bit values it
+    # remembers the last nibble not made up entirely of that value, so that a trailing
+    # padding run can be dropped without scanning back over the data
+    def __init__(self):
+        self.data = bytearray()
+        self.acc = 0
+        self.acc_len = 0
+        self.nibbles = 0
+        self.base = 0
+        self.pos = 0
+        self.last = [-1, -1]
+
+    def write(self, v, b):
+        self.pos += b
+        self.acc = (self.acc << b) | v
+        self.acc_len += b
+        while self.acc_len >= 4:
+            self.acc_len -= 4
+            n = self.acc >> self.acc_len
+            self.acc &= (1 << self.acc_len) - 1
+            if n != 0:
+                self.last[1] = self.nibbles
+            if n != 15:
+                self.last[0] = self.nibbles
+            if self.nibbles & 1:
+                self.data[-1] |= n
+            else:
+                self.data.append(n << 4)
+            self.nibbles += 1
+
+    def flush(self):
+        # hands out the bytes that trimming can no longer touch, i.e. those before the
+        # last nibble holding a 0 or a 1, whichever comes first. self.base counts the
+        # nibbles handed out so far
+        safe = (min(self.last) - self.base) // 2
+        if safe <= 0:
+            return b""
+        out = bytes(self.data[:safe])
+        del self.data[:safe]
+        self.base += 2 * safe
+        return out
+
+    def trim(self):
+        # drops the complete nibbles at the end that only repeat the last bit written
+        # (the padding) and returns the number of nibbles left
+        if self.acc_len > 0:
+            pad = self.acc & 1
+        elif self.nibbles > 0:
+            pad = (self.data[-1] >> (4 if self.nibbles & 1 else 0)) & 1
+        else:
+            return 0
+        keep = self.last[1 - pad] + 1
+        del self.data[(keep - self.base + 1) // 2:]
+        if keep & 1:
+            self.data[-1] &= 0xf0
+        self.acc = self.acc_len = 0
+        self.nibbles = keep
+        return keep
+
+class encoder:
+    # the state of a single encode: the bit source, the position in the current word
+    # and the trace hook. dayada creates one per call, so its instances can be shared
+    def __init__(self, lang, bits, emit = None):
+        self.lang = lang
+        self.bits = bits
+        self.emit = emit
         self.syl_len = 0
-        self.bindata = ""
-        self.bindata_cache = ""
-        self.hexdata = ""
-        self.yaddata = ""
+        self.syl_index = -1
         self.terminate = False
         self.first = True
-        self.consonantal = False
+        self.partial = False
 
-    def set_marker(self, mark):
-        self.marker = mark
+    def chomp(self, b, part):
+        # all data bits consumed, only padding left. The decoder finds the end of the
+        # data by the padding, but it can't read the end bit of the last syllable of
+        # a language without finals back: when that bit would be all the padding
+        # there is, one more syllable is written
+        if self.bits.exhausted() and not (part == "end" and self.lang.finals_len == -1 and self.bits.pos == self.bits.nbits):
+            self.terminate = True
+        pos = self.bits.pos
+        out, k = self.bits.read(b)
+        if self.emit is not None:
+            self.emit(traceevent(self.syl_index, pos, tobits(out, k), part))
+        return out
 
-    def encrypt(self, pwd, data, lang = None):
-        if lang:
-            self.set_lang(self.find_language(lang))
-        x = simplecrypto.encrypt(data, pwd)
-        enc = self.morph(x, "base64", "hex")
-        dayada = self.encodehex(enc)
-        return dayada
+    def syllable(self):
+        l = self.lang
+        self.syl_len += 1
+        self.syl_index += 1
+        if self.terminate:
+            return ""
+        syl = ""
+        consonantal = False
+        if (self.first):
+            if l.initials_len > -1:
+                initial = self.chomp(1, "ini")
+                if (initial):
+                    index = self.chomp(l.initials_len, "idx")
+                    syl += l.initials[index]
+        else:
+            if len(l.matches) > 0:
+                consonantal = self.chomp(1, "cmatch")
+        num = self.chomp(l.core_len, "syl")
+        if num + l.exp2_syl < l.max_syl:
+            num += self.chomp(1, "excess") * l.exp2_syl
+        syl += l.matched[num] if consonantal else l.syllables[num]
 
-    def decrypt(self, pwd, data):
-        adayad = self.decodehex(data)
-        content = self.morph(adayad, "hex", "base64")
-        recontent = simplecrypto.decrypt(content, pwd)
-        if not recontent:
-            recontent = data
-        return recontent
-
-    def encode(self, data):
-        return self.encodehex(self.morph(data, None, "hex"))
-
-    def encodehex(self, h):
-        if self.lang is None:
-            self.set_default_lang()
-        self.reset()
-        self.hexdata = h
+        ter = 1
+        if (self.syl_len >= l.syl_max_len):
+            self.syl_len = 0
+        else:
+            ter = self.chomp(1, "end")
+        if ter:
+            if l.finals_len > -1:
+                syl += l.finals[self.chomp(l.finals_len, "final")]
+            syl += " "
+            self.syl_len = 0
+        self.first = ter
+        return syl
+
+    def words(self):
+        word = []
+        while not self.terminate:
+            syl = self.syllable()
+            if syl.endswith(" "):
+                word.append(syl[:-1])
+                yield "".join(word)
+                word = []
+            else:
+                word.append(syl)
+        if word:
+            # the data ran out in the middle of a word
+            self.partial = True
+            yield "".join(word)
+
+    def counts(self):
+        # the syllables written so far, the data bits read and the padding bits after them
+        bits = self.bits
+        return {"syllables": self.syl_index + 1, "bits": min(bits.pos, bits.nbits), "padding_bits": max(bits.pos - bits.nbits, 0)}
+
+class sizer:
+    # reads the bits like an encoder does, but only adds up the lengths of the words
+    # it would write, looked up in tables, instead of writing them
+    def __init__(self, lang, bits):
+        self.lang = lang
+        self.bits = bits
+        self.terminate = False
+        # the characters and UTF-8 bytes of every token, lowercase as they are written
+        self.initials, self.syllables, self.matched, self.finals = ([(len(t.lower()), len(t.lower().encode("utf-8"))) for t in tokens] for tokens in (lang.initials, lang.syllables, lang.matched, lang.finals))
+
+    def chomp(self, b, end = False):
+        # ends where encoder.chomp() does
+        if self.bits.exhausted() and not (end and self.lang.finals_len == -1 and self.bits.pos == self.bits.nbits):
+            self.terminate = True
+        return self.bits.read(b)[0]
+
+    def run(self):
+        # the number of words, and their characters and UTF-8 bytes without spaces
+        l = self.lang
+        words = chars = utf8 = 0
+        syl_len = 0
+        first = True
+        while not self.terminate:
+            syl_len += 1
+            table = self.syllables
+            if first:
+                if l.initials_len > -1 and self.chomp(1):
+                    c, b = self.initials[self.chomp(l.initials_len)]
+                    chars += c
+                    utf8 += b
+            elif len(l.matches) > 0 and self.chomp(1):
+                table = self.matched
+            num = self.chomp(l.core_len)
+            if num + l.exp2_syl < l.max_syl:
+                num += self.chomp(1) * l.exp2_syl
+            c, b = table[num]
+            chars += c
+            utf8 += b
+            ter = 1
+            if syl_len < l.syl_max_len:
+                ter = self.chomp(1, True)
+            else:
+                syl_len = 0
+            if ter:
+                if l.finals_len > -1:
+                    c, b = self.finals[self.chomp(l.finals_len)]
+                    chars += c
+                    utf8 += b
+                words += 1
+                syl_len = 0
+            first = ter
+        # the data ran out in the middle of a word
+        if not first:
+            words += 1
+        return words, chars, utf8
+
+class npencoder:
+    # an encoder doing the bulk of the work in NumPy array passes, with the same words
+    # as encoder. For every bit position of a block it works out where a word starting
+    # there would end, using tables of what a syllable reads from the bits; following
+    # these from one word to the next finds the words, whose texts are then gathered
+    # from the syllable tables. The last bits, where the padding comes in, and inputs
+    # too short to be worth it are left to encoder
+    block = 1 << 20
+    min_bits = 1 << 16
+
+    def __init__(self, lang, chunks, nbits = None):
+        self.lang = lang
+        self.chunks = chunks
+        self.nbits = nbits
+        self.partial = False
+        self.tables = None
+        # the syllables of the bulk words, the bits they read and the encoder of the rest
+        self.syllables = 0
+        self.offset = 0
+        self.tail = None
+        # the most bits each syllable of a word can read, and a whole word
+        l = lang
+        self.widths = []
+        for k in range(l.syl_max_len):
+            first = k == 0
+            self.widths.append((1 + max(l.initials_len, 0) if first and l.initials_len > -1 else 0) + (1 if not first and l.matches else 0) + l.core_len + 1 + (0 if k == l.syl_max_len - 1 else 1))
+        self.word_bits = sum(self.widths) + max(l.finals_len, 0)
+
+    def words(self):
+        buf = bytearray()
+        dropped = 0
+        pos = 0
+        ended = False
+        chunks = iter(self.chunks)
         while True:
-            self.yaddata += self.syl_encodehex()
-            if self.terminate:
+            while not ended and len(buf) * 8 - pos < self.block + self.word_bits:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    ended = True
+                else:
+                    buf += chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            avail = len(buf) * 8
+            if ended and self.nbits is not None:
+                avail = min(avail, self.nbits - 8 * dropped)
+            if self.tables is None and avail - pos >= self.min_bits:
+                self.setup()
+            if self.tables is not None:
+                # words are only taken in bulk when all their bits are data
+                end = pos + self.block if not ended else avail - self.word_bits + 1
+                if end > pos:
+                    words, pos = self.bulk(buf, pos, end)
+                    self.offset = 8 * dropped + pos
+                    yield from words
+            if ended:
                 break
-        if self.marker:
-            self.yaddata = self.add_dayada(self.yaddata)
-        self.yaddata = self.add_punctuation(self.yaddata)
-        self.yaddata = self.add_capitalization(self.yaddata)
-        return self.yaddata 
+            cut = pos >> 3
+            del buf[:cut]
+            dropped += cut
+            pos -= 8 * cut
+        cut = pos >> 3
+        enc = encoder(self.lang, bitreader(bytes(buf[cut:]), avail - 8 * cut))
+        enc.bits.read(pos & 7)
+        self.offset = 8 * (dropped + cut)
+        self.tail = enc
+        yield from enc.words()
+        self.partial = enc.partial
 
-    def decode(self, yada, format = "hex"):
-        return self.morph(self.decodehex(yada), "hex", format)
+    def counts(self):
+        out = {"syllables": self.syllables, "bits": self.offset, "padding_bits": 0}
+        if self.tail is not None:
+            for k, v in self.tail.counts().items():
+                out[k] += v
+        return out
 
-    def decodehex(self, yada):
-        if self.lang is None:
-            self.set_default_lang()
-        self.reset()
-        self.yaddata = yada
+    def setup(self):
+        # for each syllable of a word, a table from the next bits to the number of bits
+        # it reads, times two, plus one if the word ends with it
+        import numpy as np
+        l = self.lang
+        ends = np.zeros(l.exp2_syl, np.int64)
+        ends[:l.max_syl - l.exp2_syl] = 1
+        self.excess = ends
+        self.tables = []
+        for k, width in enumerate(self.widths):
+            first = k == 0
+            last = k == l.syl_max_len - 1
+            w = np.arange(1 << width, dtype = np.int64)
+            off = np.zeros_like(w)
+            bits = lambda n: (w >> (width - off - n)) & ((1 << n) - 1)
+            if first and l.initials_len > -1:
+                off += 1 + bits(1) * l.initials_len
+            elif not first and l.matches:
+                off += 1
+            num = bits(l.core_len)
+            off += l.core_len
+            off += ends[num]
+            end = 1
+            if not last:
+                end = bits(1)
+                off += 1
+            self.tables.append((width, (off * 2 + end).astype(np.uint8)))
+        # the texts of the syllable codes, plain and matched, of the initials and of the
+        # finals, then nothing, for the parts a word doesn't have, and a space
+        self.tokens = np.array(l.syllables + l.matched + l.initials + l.finals + ("", " "), dtype = object)
+        self.empty = len(self.tokens) - 2
+
+    def bulk(self, buf, pos, end):
+        # the words starting from pos up to end, and where the one after them starts
+        tokens, p = self.parse(buf, pos, end)
+        text = "".join(self.tokens[tokens[tokens != self.empty]].tolist())
+        return text.split(" ")[:-1], p
+
+    def parse(self, buf, pos, end):
+        # the tokens of the words starting from pos up to end, as indexes into
+        # self.tokens, syl_max_len + 3 to a word, and where the one after them starts
+        import numpy as np
+        l = self.lang
+        base = pos >> 3
+        data = np.frombuffer(bytes(buf[base:((end + self.word_bits) >> 3) + 1]) + bytes(8), np.uint8)
+        # the 64 bits from each bit on, which hold any field a word reads from there
+        n = len(data) - 7
+        window = np.zeros(n, np.uint64)
+        for j in range(8):
+            window |= data[j:j + n].astype(np.uint64) << np.uint64(56 - 8 * j)
+        window = (window[:, None] << np.arange(8, dtype = np.uint64)).ravel()
+        def field(q, width):
+            if not width:
+                return np.zeros(len(q), np.int64)
+            return (window[q] >> np.uint64(64 - width)).view(np.int64)
+        start = pos - 8 * base
+        stop = end - 8 * base
+        # what each syllable of a word reads from each position on, and from that where
+        # a word starting at each position ends
+        steps = [table[(window >> np.uint64(64 - width)).view(np.int64)] for width, table in self.tables]
+        t = steps[0][start:stop]
+        q = np.arange(start, stop, dtype = np.int64) + (t >> 1)
+        done = t & 1
+        for step in steps[1:]:
+            t = step[q]
+            q += (t >> 1) * (done ^ 1)
+            done |= t & 1
+        # followed from word to word through a memoryview, which is quicker to index
+        jumps = memoryview(q + max(l.finals_len, 0) - start)
+        starts = []
+        i = 0
+        while i < stop - start:
+            starts.append(i)
+            i = jumps[i]
+        p = start + i
+        # the same again, on the word starts only, picking up the tokens of each word:
+        # its initial, its syllables, its final and a space
+        q = np.array(starts, dtype = np.int64) + start
+        initials = len(l.syllables) + len(l.matched)
+        finals = initials + len(l.initials)
+        empty = finals + len(l.finals)
+        tokens = np.full((len(q), l.syl_max_len + 3), empty, np.int64)
+        tokens[:, -1] = empty + 1
+        alive = np.ones(len(q), np.int64)
+        if l.initials_len > -1:
+            ini = field(q, 1)
+            q += 1
+            tokens[:, 0] = np.where(ini == 1, initials + field(q, l.initials_len), empty)
+            q += ini * l.initials_len
+        for k in range(l.syl_max_len):
+            self.syllables += int(alive.sum())
+            matched = 0
+            if k and l.matches:
+                matched = field(q, 1)
+                q += alive
+            num = field(q, l.core_len)
+            q += alive * l.core_len
+            excess = self.excess[num] * alive
+            num += field(q, 1) * excess * l.exp2_syl
+            q += excess
+            tokens[:, k + 1] = np.where(alive == 1, num + matched * l.max_syl, empty)
+            if k < l.syl_max_len - 1:
+                ends = field(q, 1)
+                q += alive
+                alive &= ends ^ 1
+        if l.finals_len > -1:
+            tokens[:, -2] = finals + field(q, l.finals_len)
+        return tokens.ravel(), p + 8 * base
+
+class npsizer(npencoder):
+    # a sizer doing the bulk of the work in NumPy array passes, see npencoder: it
+    # adds up the lengths of the tokens of the words instead of joining their texts
+    def __init__(self, lang, data):
+        npencoder.__init__(self, lang, [data], len(data) * 8)
+
+    def run(self):
+        import numpy as np
+        data = self.chunks[0]
+        last = self.nbits - self.word_bits + 1
+        words = chars = utf8 = 0
+        pos = 0
+        if self.nbits >= self.min_bits:
+            self.setup()
+            # the characters and UTF-8 bytes of every token, spaces left out
+            lengths = np.array([(len(t.lower()), len(t.lower().encode("utf-8"))) for t in self.tokens[:-1]] + [(0, 0)], np.int64)
+            while pos < last:
+                tokens, pos = self.parse(data, pos, min(pos + self.block, last))
+                words += len(tokens) // (self.lang.syl_max_len + 3)
+                c, b = lengths[tokens].sum(axis = 0)
+                chars += int(c)
+                utf8 += int(b)
+        cut = pos >> 3
+        tail = sizer(self.lang, bitreader(bytes(data[cut:]), self.nbits - 8 * cut))
+        tail.bits.read(pos & 7)
+        n, c, b = tail.run()
+        return words + n, chars + c, utf8 + b
+
+class wordgen:
+    # draws n words of a language straight from its tables rather than from data, a
+    # batch at a time: an initial half of the time, min_syl to max_syl syllables, all
+    # but the first matched half of the time, and a final, each picked uniformly. With
+    # unique, words drawn before are skipped, for which only their hashes are kept.
+    # Like an encoder, it can be punctuated by iterformat()
+    batch = 65536
+
+    def __init__(self, lang, n, min_syl = 1, max_syl = None, seed = None, unique = False, numpy = False):
+        if max_syl is None:
+            max_syl = lang.syl_max_len
+        if not 1 <= min_syl <= max_syl:
+            raise Exception("Words need at least one syllable, and no more than max_syl")
+        self.lang = lang
+        self.n = n
+        self.min_syl = min_syl
+        self.max_syl = max_syl
+        self.unique = unique
+        self.rng = random.Random(seed)
+        self.partial = False
+        # the tokens, lowercase as they are written
+        self.syllables, self.matched, self.initials, self.finals = (tuple(t.lower() for t in tokens) for tokens in (lang.syllables, lang.matched, lang.initials, lang.finals))
+        self.np = None
+        if numpy:
+            import numpy as np
+            self.np = np.random.default_rng(self.rng.getrandbits(128))
+            self.tokens = np.array(self.syllables + self.matched + self.initials + self.finals + ("", " "), dtype = object)
+        if unique and n > self.space():
+            raise Exception("There are fewer than {} words of {} to {} syllables".format(n, min_syl, max_syl))
+
+    def space(self):
+        # how many ways there are to draw a word, an upper bound on the distinct words
+        l = self.lang
+        first = (len(l.initials) + 1 if l.initials else 1) * l.max_syl * max(len(l.finals), 1)
+        return sum(first * ((2 if l.matches else 1) * l.max_syl) ** (k - 1) for k in range(self.min_syl, self.max_syl + 1))
+
+    def draw(self, k):
+        if self.np is not None:
+            return self.npdraw(k)
+        r = self.rng
+        out = []
+        for i in range(k):
+            w = r.choice(self.initials) if self.initials and r.random() < .5 else ""
+            w += r.choice(self.syllables)
+            for j in range(r.randint(self.min_syl, self.max_syl) - 1):
+                w += r.choice(self.matched if self.matched and r.random() < .5 else self.syllables)
+            if self.finals:
+                w += r.choice(self.finals)
+            out.append(w)
+        return out
+
+    def npdraw(self, k):
+        # the tokens of all words at once, like npencoder gathers them: the initial,
+        # the syllables, the final and a space, or nothing for the parts left out
+        import numpy as np
+        g = self.np
+        l = self.lang
+        matched = len(self.syllables)
+        initials = matched + len(self.matched)
+        finals = initials + len(self.initials)
+        empty = finals + len(self.finals)
+        tokens = np.full((k, self.max_syl + 3), empty, np.int64)
+        tokens[:, -1] = empty + 1
+        if self.initials:
+            # the upper half of the draws is no initial
+            ini = g.integers(0, 2 * len(self.initials), k)
+            tokens[:, 0] = np.where(ini < len(self.initials), initials + ini, empty)
+        lengths = g.integers(self.min_syl, self.max_syl + 1, k)
+        for j in range(self.max_syl):
+            num = g.integers(0, l.max_syl, k)
+            if j and self.matched:
+                num += g.integers(0, 2, k) * matched
+            tokens[:, j + 1] = np.where(j < lengths, num, empty)
+        if self.finals:
+            tokens[:, -2] = finals + g.integers(0, len(self.finals), k)
+        return "".join(self.tokens[tokens.ravel()].tolist()).split(" ")[:-1]
+
+    def words(self):
+        left = self.n
+        seen = set()
+        misses = 0
+        while left > 0:
+            batch = self.draw(min(left, self.batch))
+            if not self.unique:
+                left -= len(batch)
+                yield from batch
+                continue
+            # the words of the batch by their hashes, in the order they were drawn first
+            fresh = dict(zip(map(hash, batch), batch))
+            for h in seen.intersection(fresh):
+                del fresh[h]
+            seen.update(fresh)
+            fresh = list(fresh.values())
+            if fresh:
+                misses = 0
+            else:
+                # different draws can write the same word, so the space can run out
+                # before n words
+                misses += len(batch)
+                if misses > 1000 + 10 * len(seen):
+                    raise Exception("Ran out of unique words after {}".format(len(seen)))
+            left -= len(fresh)
+            yield from fresh
+
+    def counts(self):
+        # the words are all the meter of iterformat() counts
+        return {}
+
+class decoder:
+    # the state of a single decode: the normalized text with its cursor, the bit sink
+    # and the trace hook. guess is called with the text to pick the language
+    def __init__(self, lang, guess, emit = None):
+        self.lang = lang
+        self.vowel_re = lang.vowel_re
+        self.guess = guess
+        self.emit = emit
+        self.out = bitwriter()
+        self.text = ""
+        self.cursor = 0
+        self.vowel_at = -1
+        self.space_at = -1
+        self.source = None
+        self.syl_len = 0
+        self.syl_index = -1
+        self.terminate = False
+        self.first = True
+        self.ended = 0
+
+    def load(self, text):
         # turn all upper
-        self.yaddata = self.yaddata.upper()
+        text = text.upper()
         # remove punctuation
-        self.yaddata = re.sub("<[^>]*>", "", self.yaddata, )
-        self.set_lang(self.guess_lang(self.yaddata))
-        self.yaddata = re.sub("[^"+self.allchars+"]", "", self.yaddata, flags=re.IGNORECASE)
+        text = re.sub("<[^>]*>", "", text)
+        self.lang = self.guess(text) or self.lang
+        self.vowel_re = self.lang.vowel_re
+        text = self.lang.strip_re.sub("", text)
         # remove ya dayada
-        if (self.yaddata.find(self.lang.marker + " ") != -1):
-            self.yaddata = self.yaddata.replace(self.lang.marker + " ", "")
-        syl_len = 0
+        self.text = text.replace(self.lang.marker + " ", "")
+
+    def stream(self, chunks):
+        self.source = self.normalize(chunks)
+
+    def run(self):
         while True:
-            self.syl_decodehex()
+            self.syllable()
             if self.terminate:
                 break
-        self.backtrack()
-        return self.hexdata
-
-    def backtrack(self):
-        lastBit = ""
-        lastHex = ""
-        if (self.bindata == ""):
-            lastBit = self.bin2num_hex2bin(self.hexdata[-1])[-1]
-        else:
-            lastBit = self.bindata[-1]
-        if (lastBit == "1"):
-            lastHex = "f"
-        else:
-            lastHex = "0"
-        while (self.hexdata[-1] == lastHex):
-            self.hexdata = self.hexdata[:-1]
-            
+        return self.out.trim()
+
+    def iterrun(self):
+        while True:
+            while len(self.text) - self.cursor < 64 and self.refill():
+                pass
+            self.syllable()
+            if self.terminate:
+                break
+            data = self.out.flush()
+            if data:
+                yield data
+        if self.out.trim() & 1:
+            raise Exception("Decoded data does not end on a byte boundary")
+        yield bytes(self.out.data)
+
+    def normalize(self, chunks, window = 65536):
+        # the streaming counterpart of load(): yields the text upper-cased, without
+        # tags, foreign characters and markers. The language is guessed from the first
+        # window characters
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        head = []
+        head_len = 0
+        held = ""
+        pending = ""
+        target = None
+        final = False
+        chunks = iter(chunks)
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+                chunk = ""
+            if not isinstance(chunk, str):
+                chunk = decoder.decode(chunk, final)
+            text = held + chunk.upper()
+            held = ""
+            # a tag still open at the end of the chunk may close in the next one
+            lt = text.rfind("<")
+            if not final and lt > text.rfind(">") and len(text) - lt < window:
+                held = text[lt:]
+                text = text[:lt]
+            text = re.sub("<[^>]*>", "", text)
+            if target is None:
+                head.append(text)
+                head_len += len(text)
+                if not final and head_len < window:
+                    continue
+                text = "".join(head)
+                self.lang = self.guess(text) or self.lang
+                self.vowel_re = self.lang.vowel_re
+                target = self.lang.marker + " "
+            pending += self.lang.strip_re.sub("", text)
+            # drops the markers, keeping back what could be the start of one
+            out = []
+            i = 0
+            while True:
+                j = pending.find(target, i)
+                if j == -1:
+                    break
+                out.append(pending[i:j])
+                i = j + len(target)
+            keep = len(pending) if final else max(i, len(pending) - len(target) + 1)
+            out.append(pending[i:keep])
+            pending = pending[keep:]
+            text = "".join(out)
+            if text:
+                yield text
+
+    def refill(self):
+        # streaming decodes only: drops the text before the cursor and appends the next
+        # piece of normalized text
+        if self.source is None:
+            return False
+        piece = next(self.source, None)
+        if piece is None:
+            self.source = None
+            return False
+        self.text = self.text[self.cursor:] + piece
+        self.cursor = 0
+        self.vowel_at = -1
+        self.space_at = -1
+        return True
+
     def search_vowel(self):
-        m = self.vowel_re.search(self.yaddata)
-        if m:
-            return m.start()
-        else:
+        # the cursor only moves forward, so a position found earlier stays valid until
+        # the cursor passes it
+        if self.vowel_at < self.cursor:
+            m = self.vowel_re.search(self.text, self.cursor)
+            while m is None and self.refill():
+                m = self.vowel_re.search(self.text, self.cursor)
+            self.vowel_at = m.start() if m else len(self.text)
+        if self.vowel_at == len(self.text):
             return -1
+        return self.vowel_at
 
-    def syl_decodehex(self):
+    def search_space(self):
+        if self.space_at < self.cursor:
+            spc = self.text.find(" ", self.cursor)
+            self.space_at = spc if spc != -1 else len(self.text)
+        return self.space_at
+
+    def syllable(self):
+        l = self.lang
         self.syl_len += 1
-        if self.first and self.initials_len > -1:
-            initial = self.chomp_list(self.lang.initials)
+        self.syl_index += 1
+        if self.first and l.initials_len > -1:
+            initial = self.chomp_list(l.initial_tokens)
             if (initial == -1):
-                self.assemble("0", "noini")
+                self.assemble(0, 1, "noini")
             else:
-                self.assemble("1", "ini")
-                self.assemble(self.bin2num_num2bin(initial, self.initials_len), self.lang.initials[initial])
+                self.assemble(1, 1, "ini")
+                self.assemble(initial, l.initials_len, "i({})", l.initials[initial])
         frs = self.search_vowel()
-        start = self.yaddata[:frs]
-        mtc = self.find_list(start, self.lang.consonants)
-        if (len(self.lang.matches) > 0):
+        if frs == -1:
+            # everything but the last character, as the remainder[:-1] slice used to be
+            frs = max(self.cursor, len(self.text) - 1)
+        mtc = self.find_list(self.cursor, frs, l.consonant_tokens)
+        if (len(l.matches) > 0):
             if mtc == -1:
-                self.assemble("1", "cmatch")
-                self.chomp_list(self.lang.matches)
+                self.assemble(1, 1, "cmatch")
+                self.chomp_list(l.match_tokens)
             elif not self.first:
-                self.assemble("0", "nofirstandnoc")
-        con = self.chomp_list(self.lang.consonants)
-        vow = self.chomp_list(self.lang.vowels)
+                self.assemble(0, 1, "nofirstandnoc")
+        con = self.chomp_list(l.consonant_tokens)
+        vow = self.chomp_list(l.vowel_tokens)
         if con < 0 or vow < 0:
             self.terminate = True
             return
-        num = con + self.consonants_len * vow
-        add = ""
-        if num >= self.exp2_syl:
-            add = "1"
-            num -= self.exp2_syl
-        elif num + self.exp2_syl < self.max_syl:
-            add = "0"
-        self.assemble(self.bin2num_num2bin(num, self.core_len), "c("+self.lang.consonants[con]+")v("+self.lang.vowels[vow]+")")
-        if add != "":
-            self.assemble(add, "excess")
+        num, add = l.codes[con + l.consonants_len * vow]
+        self.assemble(num, l.core_len, "c({})v({})", l.consonants[con], l.vowels[vow])
+        if add != -1:
+            self.assemble(add, 1, "excess")
         frs = self.search_vowel()
         if (frs == -1):
-            if self.finals_len > -1:
+            if l.finals_len > -1:
                 # look for finals
-                fin = self.chomp_list(self.lang.finals)
+                fin = self.chomp_list(l.final_tokens)
                 if fin != -1:
-                    if (self.syl_len < self.syl_max_len):
-                        self.assemble("1", "notend")
-                    self.assemble(self.bin2num_num2bin(fin, 3), "f("+self.lang.finals[fin]+")")            
+                    if (self.syl_len < l.syl_max_len):
+                        self.assemble(1, 1, "notend")
+                    self.assemble(fin, l.finals_len, "f({})", l.finals[fin])
                 else:
-                    self.assemble("0", "end")
-                    if (self.chomp_list([self.lang.termination]) != -1):
-                        self.assemble("1", "term")
+                    self.assemble(0, 1, "end")
+                    if (self.chomp_list(l.termination_tokens) != -1):
+                        self.assemble(1, 1, "term")
                     else:
-                        self.assemble("0", "noterm")
+                        self.assemble(0, 1, "noterm")
             self.terminate = True
             return
-        
-        spc = self.yaddata.find(" ")
-        if spc == -1:
-            spc = len(self.yaddata)
 
+        spc = self.search_space()
         if frs > spc:
-            if self.syl_len < self.syl_max_len:
-                self.assemble("1", "endword")
+            if self.syl_len < l.syl_max_len:
+                self.assemble(1, 1, "endword")
             self.syl_len = 0
-            if self.finals_len > -1:
-                fin = self.chomp_list(self.lang.finals)
-                self.assemble(self.bin2num_num2bin(fin, 3), "f("+self.lang.finals[fin]+")")
-            self.chomp_list([" "])
+            self.ended += 1
+            if l.finals_len > -1:
+                # a missing final is read as the first one rather than derailing the bits
+                fin = max(self.chomp_list(l.final_tokens), 0)
+                self.assemble(fin, l.finals_len, "f({})", l.finals[fin])
+            self.chomp_list(l.space_tokens)
             self.first = True
         else:
             self.first = False
-            self.assemble("0", "moresyl")
-
-    def get_assembly(self):
-        return self.bindata_cache
-    
-    def assemble(self, s, part):
-        self.bindata += s
-        self.bindata_cache += s + " " + part + " "
-        while len(self.bindata) > 3:
-            self.hexdata += self.bin2num_bin2hex(self.bindata[:4])
-            self.bindata = self.bindata[4:]
-
-    def chomp_list(self, l):
-        if len(l) == 0:
+            self.assemble(0, 1, "moresyl")
+
+    def counts(self):
+        # the syllables and words read so far, the data bits written and the padding
+        # bits trimmed off after them
+        out = self.out
+        return {"syllables": self.syl_index + 1, "words": self.ended + (self.syl_index >= 0), "bits": 4 * out.nibbles, "padding_bits": max(out.pos - 4 * out.nibbles, 0)}
+
+    def assemble(self, num, b, part, *tokens):
+        # the part label is only formatted with the tokens when tracing
+        if self.emit is not None:
+            self.emit(traceevent(self.syl_index, self.out.pos, tobits(num, b), part.format(*tokens)))
+        self.out.write(num, b)
+
+    def chomp_list(self, table):
+        tokens, lengths = table
+        found = -1
+        size = 0
+        for n in lengths:
+            t = self.text[self.cursor:self.cursor + n]
+            i = tokens.get(t, -1)
+            if i > found:
+                found = i
+                size = len(t)
+        self.cursor += size
+        return found
+
+    def find_list(self, start, end, table):
+        tokens, lengths = table
+        if end - start > lengths[-1]:
             return -1
-        for i in reversed(range(len(l))):
-            if self.yaddata.startswith(l[i]):
-                self.yaddata = self.yaddata[len(l[i]):]
-                return i
-        return -1
-
-    def find_list(self, s, l):
-        for i in reversed(range(len(l))):
-            if (s == l[i]):
-                return i
-        return -1
-
-    def syl_encodehex(self):
-        self.syl_len += 1
-        if self.terminate:
-            return ""
-        syl = ""
-        consonantal = False
-        if (self.first):
-            if self.initials_len > -1:
-                initial = self.chomp(1, "ini")
-                if (initial):
-                    index = self.chomp(self.initials_len, "idx")
-                    syl += self.lang.initials[index]
-        else:
-            if len(self.lang.matches) > 0:
-                consonantal = self.chomp(1, "cmatch")
-        num = self.chomp(self.core_len, "syl")
-        if num + self.exp2_syl < self.max_syl:
-            num += self.chomp(1, "excess") * self.exp2_syl
-        con = self.lang.consonants[num % self.consonants_len]
-        vow = self.lang.vowels[int(num / self.consonants_len)]
-        if consonantal:
-            syl += self.lang.matches[num % self.consonants_len]
-        syl += con + vow
+        return tokens.get(self.text[start:end], -1)
 
-        ter = 1
-        if (self.syl_len >= self.syl_max_len):
-            self.syl_len = 0
+class langindex:
+    # finds the languages of a text in one pass, whatever their number: by the markers
+    # it contains, or else by how well its letters fit each alphabet
+    def __init__(self, langs):
+        self.langs = tuple(langs)
+        self.strip_re = re.compile(r"[-'`~!@#$%^&*()_|+=?;:'\",.<>{}\[\]\\/]")
+        # marker words, keyed by their first one, and the languages using them
+        self.markers = {}
+        for l in self.langs:
+            words = tuple(l.marker.split())
+            self.markers.setdefault(words[0], {}).setdefault(words, []).append(l)
+        self.alphabets = [(l, frozenset("".join(l.consonants + l.matches + l.vowels + l.initials + l.finals + (l.termination,)))) for l in self.langs]
+
+    def find(self, text):
+        # the languages whose marker is in text, in the order they were registered
+        words = self.strip_re.sub("", text.upper()).split()
+        found = set()
+        for i, w in enumerate(words):
+            for marker, langs in self.markers.get(w, {}).items():
+                if tuple(words[i:i + len(marker)]) == marker:
+                    found.update(langs)
+        return [l for l in self.langs if l in found]
+
+    def rank(self, text):
+        # (language, confidence) pairs, best first. A marker gives full confidence,
+        # otherwise it grows with the share of the letters of text in the alphabet of a
+        # language and, less so, with the share of its alphabet used, which favours the
+        # smaller alphabets when several cover the text
+        found = self.find(text)
+        letters = Counter(text.upper())
+        total = sum(n for c, n in letters.items() if c.isalpha())
+        ranked = []
+        for l, alphabet in self.alphabets:
+            if l in found:
+                confidence = 1.0
+            elif total == 0:
+                confidence = 0.0
+            else:
+                coverage = sum(letters[c] for c in alphabet) / total
+                usage = sum(1 for c in alphabet if c in letters) / len(alphabet)
+                confidence = .9 * coverage ** 2 * (.5 + .5 * usage)
+            ranked.append((l, confidence))
+        ranked.sort(key = lambda r: -r[1])
+        return ranked
+
+def expect(l, puncts):
+    # the characters and UTF-8 bytes l writes per byte of random data. The syllable
+    # codes are uniform but for the excess bit, a word ends after each syllable with a
+    # chance of 1/2 or at syl_max_len, and a separator takes the place of a space
+    def size(texts, probs):
+        return [sum(p * len(t) for t, p in zip(texts, probs)), sum(p * len(t.encode("utf-8")) for t, p in zip(texts, probs))]
+    def mean(texts):
+        return size(texts, [1 / len(texts)] * len(texts)) if texts else [0, 0]
+    low = l.max_syl - l.exp2_syl
+    probs = [(.5 if num < low or num >= l.exp2_syl else 1) / l.exp2_syl for num in range(l.max_syl)]
+    syl = size(l.syllables, probs)
+    match = size([l.matches[num % l.consonants_len] for num in range(l.max_syl)], probs) if l.matches else [0, 0]
+    initial = mean(l.initials)
+    final = mean(l.finals)
+    # the syllables of a word, and how many of them take an end bit
+    lengths = [(k, .5 ** k if k < l.syl_max_len else .5 ** (k - 1)) for k in range(1, l.syl_max_len + 1)]
+    syls = sum(k * p for k, p in lengths)
+    ends = sum(min(k, l.syl_max_len - 1) * p for k, p in lengths)
+    bits = syls * (l.core_len + low / l.exp2_syl) + ends
+    if l.initials_len > -1:
+        bits += 1 + .5 * l.initials_len
+    if l.matches:
+        bits += syls - 1
+    if l.finals_len > -1:
+        bits += l.finals_len
+    out = []
+    for i in range(2):
+        chars = .5 * initial[i] + syls * syl[i] + (syls - 1) * .5 * match[i] + final[i] + 1
+        extra = sum(sum(len(p.encode("utf-8") if i else p) - 1 for p in punc if isinstance(p, str)) for punc in puncts)
+        words = sum(sum(p for p in punc if isinstance(p, int)) for punc in puncts)
+        out.append(8 * (chars + extra / words) / bits)
+    return out
+
+def longest(l):
+    # the most characters a word of l can have
+    syl = max(len(s) for s in l.matched + l.syllables)
+    first = max((len(s) for s in l.initials), default = 0) + max(len(s) for s in l.syllables)
+    return first + (l.syl_max_len - 1) * syl + max((len(s) for s in l.finals), default = 0)
+
+# the built-in languages, built once and shared by all dayada instances
+langs = (
+    lang(
+        "en",
+        ["B", "C", "D", "F", "G", "H", "J", "K", "L", "M", "N", "P", "R", "S", "T", "V", "W", "X", "Z", "BL", "BR", "CH", "CR", "CL", "DR", "FL", "GL", "GN", "GR", "KN", "PH", "PL", "PR", "RH", "ST", "SP", "SH", "WH", "TH", "TR", "WR", "STR", "SHR"],
+        ["R", "N", "S", "L", "N", "M", "L", "P", "S", "R", "S", "L", "N", "M", "R", "N", "H", "N", "M", "N",  "S",  "M",  "L",  "S",  "N",  "S",  "D",  "S",  "N",  "S",  "L",  "N",  "N",  "S",  "N",  "N",  "M",  "T",  "N",  "M",  "S",   "N",   "L"],
+        ["A", "E", "I", "O", "U", "AE", "AI", "AY", "EE", "OO", "OU", "AU"],
+        ["A", "E", "I", "O", "U", "EU", "AI", "YO"],
+        ["R", "S", "T", "N", "RD", "ST", "NT", "NG"],
+        "SZ",
+        3,
+        "YA DAYADA"
+    ),
+    lang(
+        "jp",
+        ["",  "K", "S", "T", "H", "M", "Y", "R", "W"],
+        ["N",  "N", "N", "N", "N", "N", "N", "N", "N"],
+        ["A", "I", "U", "E", "O"],
+        [ ],
+        [ ],
+        "X",
+        3,
+        "YA TAYATA"
+    ),
+    lang(
+        "it",
+        ["B", "C", "D", "F", "G", "L", "M", "N", "P", "R", "S", "T", "V", "Z", "BR", "CR", "CL", "FL", "FR", "GR", "PL", "PR", "SC", "ST", "SP", "TR", "STR"],
+        ["R", "C", "D", "F", "N", "B", "L", "G", "P", "R", "S", "T", "N", "Z", "N",  "S",  "N",  "F",  "R",  "N",  "S",  "M",  "N",  "R",  "L",  "L",  "S"],
+        ["A", "E", "I", "O", "U", "AI", "AU"],
+        ["A", "E", "I", "O", "U", "EU", "AU", "AI"],
+        [ ],
+        "SZ",
+        2,
+        "ITA LIANO"
+    ),
+    lang(
+        "hi",
+        ["",  "H", "K", "L", "M", "N", "P", "W", "ʻ"],
+        [],
+        ["A", "E", "I", "O", "U", "Ā", "Ē", "Ī", "Ō", "Ū"],
+        [],
+        [],
+        "X",
+        5,
+        "KA MAʻAINA"
+    )
+)
+
+# the fields of a language file, all required
+langfields = {
+    "name": str, "consonants": list, "matches": list, "vowels": list, "initials": list,
+    "finals": list, "termination": str, "syl_max_len": int, "marker": str
+}
+
+def readlangs(name, content):
+    # the languages defined in a JSON or TOML file: one language, a list of them, or
+    # a table whose langs entry is a list of them
+    if name.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise Exception("Reading {} requires Python 3.11 or the tomli package".format(name))
+        data = tomllib.loads(content.decode("utf-8"))
+    else:
+        import json
+        data = json.loads(content)
+    if isinstance(data, dict) and "langs" in data:
+        data = data["langs"]
+    if isinstance(data, dict):
+        data = [data]
+    out = []
+    for d in data:
+        for field, kind in langfields.items():
+            if not isinstance(d.get(field), kind):
+                raise Exception("Language file {} needs a {} {}".format(name, kind.__name__, field))
+            if kind is list and not all(isinstance(t, str) for t in d[field]):
+                raise Exception("Language file {} needs strings in {}".format(name, field))
+        out.append(lang(*(d[field] for field in langfields)))
+    return out
+
+# the version of the compiled languages in the cache, to be raised whenever the lang
+# class or readlangs() change what they hold
+cache_version = 1
+
+def cachedir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("PYDAYADA_CACHE") or os.path.join(base, "pydayada")
+
+def trustcache(path):
+    # loading a pickle can run any code, so the cache is only read from a directory
+    # of the user's own that no one else can write to. There are no owners to check
+    # on Windows
+    if not hasattr(os, "getuid"):
+        return True
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+def load_langs(path, cache = None):
+    # the languages defined in a file or in the .json and .toml files of a directory.
+    # Each file is validated and compiled once, then the compiled languages are kept in
+    # the cache directory, under the hash of the file content and cache_version.
+    # cache = False skips it, as does a directory that fails trustcache()
+    import hashlib
+    import pickle
+    if os.path.isdir(path):
+        names = sorted(os.path.join(path, n) for n in os.listdir(path) if n.endswith((".json", ".toml")))
+    else:
+        names = [path]
+    if cache is None:
+        cache = cachedir()
+    if cache:
+        try:
+            # only the user's own, whatever the umask, to pass trustcache()
+            os.makedirs(cache, mode = 0o700, exist_ok = True)
+            if not trustcache(cache):
+                log.warning("Not using cache %s, which isn't the user's own or others can write to", cache)
+                cache = False
+        except OSError as e:
+            log.debug("Cannot use cache %s: %s", cache, e)
+            cache = False
+    out = []
+    for name in names:
+        with open(name, "rb") as f:
+            content = f.read()
+        if not cache:
+            out.extend(readlangs(name, content))
+            continue
+        key = hashlib.sha256(content + os.path.splitext(name)[1].encode() + b"%d" % cache_version).hexdigest()
+        cached = os.path.join(cache, key + ".pickle")
+        try:
+            with open(cached, "rb") as f:
+                out.extend(pickle.load(f))
+            continue
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        loaded = readlangs(name, content)
+        try:
+            with open(cached + ".tmp{}".format(os.getpid()), "wb") as f:
+                pickle.dump(loaded, f)
+            os.replace(f.name, cached)
+        except OSError as e:
+            log.debug("Cannot cache languages of %s: %s", name, e)
+        out.extend(loaded)
+    return out
+
+class aesgcm:
+    # AES-256-GCM from pycryptodome, on raw bytes, with the key derived from the
+    # password by scrypt. The data is sealed chunk_size bytes at a time, each chunk with
+    # its own tag, so a stream is checked as it is read and a wrong password fails on
+    # the first chunk. The nonce of a chunk is a random prefix and the chunk number,
+    # and the header and whether it is the last chunk are authenticated along with it,
+    # so chunks can be neither reordered nor dropped
+    version = 1
+    salt_len = 16
+    prefix_len = 8
+    tag_len = 16
+    # version, salt, nonce prefix and chunk size
+    header_len = 1 + salt_len + prefix_len + 4
+
+    def __init__(self, chunk_size = 65536):
+        self.chunk_size = chunk_size
+
+    def key(self, pwd, salt):
+        from Crypto.Protocol.KDF import scrypt
+        if isinstance(pwd, str):
+            pwd = pwd.encode("utf-8")
+        return scrypt(pwd, salt, 32, N = 2**14, r = 8, p = 1)
+
+    def cipher(self, key, header, n, last):
+        from Crypto.Cipher import AES
+        prefix = header[1 + self.salt_len:1 + self.salt_len + self.prefix_len]
+        cipher = AES.new(key, AES.MODE_GCM, nonce = prefix + n.to_bytes(4, "big"))
+        cipher.update(header + bytes([last]))
+        return cipher
+
+    def encrypt(self, pwd, data):
+        return b"".join(self.iterencrypt(pwd, [data]))
+
+    def decrypt(self, pwd, data):
+        return b"".join(self.iterdecrypt(pwd, [data]))
+
+    def iterencrypt(self, pwd, chunks):
+        from Crypto.Random import get_random_bytes
+        salt = get_random_bytes(self.salt_len)
+        header = bytes([self.version]) + salt + get_random_bytes(self.prefix_len) + self.chunk_size.to_bytes(4, "big")
+        key = self.key(pwd, salt)
+        yield header
+        buf = bytearray()
+        n = 0
+        for chunk in chunks:
+            buf += chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            # the last chunk is held back, as it is sealed differently
+            while len(buf) > self.chunk_size:
+                data, tag = self.cipher(key, header, n, 0).encrypt_and_digest(bytes(buf[:self.chunk_size]))
+                yield data + tag
+                del buf[:self.chunk_size]
+                n += 1
+        data, tag = self.cipher(key, header, n, 1).encrypt_and_digest(bytes(buf))
+        yield data + tag
+
+    def iterdecrypt(self, pwd, chunks):
+        buf = bytearray()
+        header = None
+        n = 0
+        for chunk in chunks:
+            buf += chunk
+            if header is None:
+                if len(buf) < self.header_len:
+                    continue
+                header = bytes(buf[:self.header_len])
+                del buf[:self.header_len]
+                if header[0] != self.version:
+                    raise Exception("Unknown encryption format {}".format(header[0]))
+                frame = int.from_bytes(header[-4:], "big") + self.tag_len
+                key = self.key(pwd, header[1:1 + self.salt_len])
+            while len(buf) > frame:
+                yield self.open(key, header, n, 0, buf[:frame])
+                del buf[:frame]
+                n += 1
+        if header is None or len(buf) < self.tag_len:
+            raise Exception("Encrypted data is truncated")
+        yield self.open(key, header, n, 1, buf)
+
+    def open(self, key, header, n, last, frame):
+        try:
+            return self.cipher(key, header, n, last).decrypt_and_verify(bytes(frame[:-self.tag_len]), bytes(frame[-self.tag_len:]))
+        except ValueError:
+            raise Exception("Wrong password or corrupted data")
+
+class simplecipher:
+    # the simplecrypto format of earlier versions, for whole messages only
+    def encrypt(self, pwd, data):
+        return b64decode(crypto().encrypt(data, pwd))
+
+    def decrypt(self, pwd, data):
+        out = crypto().decrypt(b64encode(data).decode(), pwd)
+        if not out:
+            raise Exception("Wrong password or corrupted data")
+        return out
+
+    def iterencrypt(self, pwd, chunks):
+        yield self.encrypt(pwd, b"".join(c.encode("utf-8") if isinstance(c, str) else c for c in chunks))
+
+    def iterdecrypt(self, pwd, chunks):
+        yield self.decrypt(pwd, b"".join(chunks))
+
+class framer:
+    # cuts data into frames of size bytes that are encoded as paragraphs of their own.
+    # Each frame starts with a header of the version, whether it is the last frame, its
+    # sequence number, the frame size and the length of its data, followed by a CRC-32
+    # of the header and the data, so frames can be decoded alone, in any order, and a
+    # corrupted one is told apart from the others
+    version = 1
+    header_len = 1 + 1 + 4 + 4 + 4 + 4
+
+    def __init__(self, size = 4096):
+        if size < 1:
+            raise Exception("Frames need at least one byte")
+        self.size = size
+
+    def split(self, chunks):
+        # yields the frames of a stream of bytes/str chunks, at least one
+        buf = bytearray()
+        seq = 0
+        for chunk in chunks:
+            buf += chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            # the last frame is held back, as it is flagged
+            while len(buf) > self.size:
+                yield self.pack(seq, 0, buf[:self.size])
+                del buf[:self.size]
+                seq += 1
+        yield self.pack(seq, 1, buf)
+
+    def pack(self, seq, last, data):
+        from zlib import crc32
+        header = bytes([self.version, last]) + seq.to_bytes(4, "big") + self.size.to_bytes(4, "big") + len(data).to_bytes(4, "big")
+        return header + crc32(header + data).to_bytes(4, "big") + data
+
+    @staticmethod
+    def unpack(raw):
+        from zlib import crc32
+        if len(raw) < framer.header_len:
+            raise Exception("Frame is truncated")
+        if raw[0] != framer.version:
+            raise Exception("Unknown frame format {}".format(raw[0]))
+        header = bytes(raw[:framer.header_len - 4])
+        data = bytes(raw[framer.header_len:])
+        seq = int.from_bytes(header[2:6], "big")
+        size = int.from_bytes(header[6:10], "big")
+        if crc32(header + data) != int.from_bytes(raw[framer.header_len - 4:framer.header_len], "big") or int.from_bytes(header[10:14], "big") != len(data) or len(data) > size:
+            raise Exception("Frame is corrupted")
+        return frame(seq, seq * size, size, bool(header[1]), data)
+
+class frameindex:
+    # random access to framed text: read() decodes only the frames that cover a byte
+    # range. Paragraph i is taken to hold frame i, as encodeframes() writes them; if
+    # that doesn't hold, the frames are all decoded once to map them. Without
+    # frame_size, the first frame is decoded to learn it
+    def __init__(self, d, texts, lang = None, frame_size = None):
+        self.d = d
+        self.frame_size = frame_size
+        self.texts = list(paragraphs([texts]) if isinstance(texts, str) else texts)
+        self.lang = lang
+        # decoded frames, or the exceptions decoding raised, by paragraph
+        self.frames = {}
+        self.where = None
+
+    def at(self, i):
+        if i not in self.frames:
+            try:
+                self.frames[i] = self.d.decodeframe(self.texts[i], lang = self.lang)
+            except Exception as e:
+                self.frames[i] = e
+        if isinstance(self.frames[i], Exception):
+            raise self.frames[i]
+        return self.frames[i]
+
+    def frame(self, seq):
+        if self.where is None and seq < len(self.texts):
+            try:
+                f = self.at(seq)
+                if f.seq == seq:
+                    return f
+            except Exception:
+                pass
+        if self.where is None:
+            self.where = {}
+            for i in range(len(self.texts)):
+                try:
+                    self.where.setdefault(self.at(i).seq, i)
+                except Exception:
+                    pass
+        if seq not in self.where:
+            raise Exception("Missing or corrupted frame {}".format(seq))
+        return self.at(self.where[seq])
+
+    def size(self):
+        # the frame size as given, or that of the first frame that decodes
+        if self.frame_size:
+            return self.frame_size
+        for i in range(len(self.texts)):
+            try:
+                f = self.at(i)
+            except Exception:
+                continue
+            return f.size
+        raise Exception("No frame could be decoded")
+
+    def read(self, start, end):
+        # the data from byte start up to end, cut short at the end of the data
+        size = self.size()
+        out = []
+        seq = start // size
+        while start < end:
+            f = self.frame(seq)
+            out.append(f.data[start - f.offset:end - f.offset])
+            if f.last:
+                break
+            seq += 1
+            start = f.offset + size
+        return b"".join(out)
+
+class lrucache:
+    # results by key, the least recently used dropped first once their sizes add up to
+    # more than max_bytes. Shared by the threads of a dayada instance, so locked
+    def __init__(self, max_bytes):
+        import threading
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last = False)[1][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+class meter:
+    # the wall time of each stage of one call, with its sizes and counts, handed to
+    # the dayada it belongs to by stop(). lap() books the time since the last lap to a
+    # stage. Without a dayada, when stats are off, every method does nothing
+    def __init__(self, d, op):
+        self.d = d
+        self.op = op
+        self.lang = None
+        self.stages = {}
+        self.counts = {}
+        self.last = time.perf_counter() if d is not None else 0
+
+    def lap(self, stage):
+        if self.d is None:
+            return
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self.last
+        self.last = now
+
+    def add(self, counts):
+        if self.d is None:
+            return
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+    def sizes(self, input = None, output = None):
+        # the data and text sizes of the call, in bytes and characters. The outermost
+        # call sets them last, so it has the final say
+        if self.d is None:
+            return
+        if input is not None:
+            self.counts["input_size"] = input
+        if output is not None:
+            self.counts["output_size"] = output
+
+    def timed(self, stage, items, outer, count = None, size = None, done = None):
+        # items, the time taken to make them booked to stage and the time between them
+        # to outer, the stage consuming them. Each item adds 1 to the count counter and
+        # its length to the size one; the counts returned by done() are added at the end
+        if self.d is None:
+            return items
+        return self.timing(stage, iter(items), outer, count, size, done)
+
+    def timing(self, stage, items, outer, count, size, done):
+        while True:
+            self.lap(outer)
+            item = next(items, None)
+            self.lap(stage)
+            if item is None:
+                break
+            if count:
+                self.counts[count] = self.counts.get(count, 0) + 1
+            if size:
+                self.counts[size] = self.counts.get(size, 0) + len(item)
+            yield item
+        if done is not None:
+            self.add(done())
+
+    def timedcall(self, stage, fn, outer):
+        if self.d is None:
+            return fn
+        def call(*args):
+            self.lap(outer)
+            try:
+                return fn(*args)
+            finally:
+                self.lap(stage)
+        return call
+
+    def handout(self, stage, items, owned, size = None):
+        # for generators: what they yield, the time until each item booked to stage.
+        # The time the caller takes in between isn't booked at all. Stops at the end
+        if self.d is None:
+            return items
+        return self.handing(stage, items, owned, size)
+
+    def handing(self, stage, items, owned, size):
+        for item in items:
+            self.lap(stage)
+            if size:
+                self.counts[size] = self.counts.get(size, 0) + len(item)
+            yield item
+            self.last = time.perf_counter()
+        self.lap(stage)
+        if owned:
+            self.stop()
+
+    def stop(self):
+        if self.d is None:
+            return
+        record = {"op": self.op, "lang": self.lang, "seconds": sum(self.stages.values()), "stages": self.stages}
+        record.update(self.counts)
+        self.d.collect(record)
+
+# what calls get when stats are off
+idle = meter(None, None)
+
+class scanrun:
+    # the run of words of one language the scanner is following: its text from its
+    # first word on, up to upto, and what to go back to if the last words turn out
+    # not to belong to it: the start of a marker, or a word that can only be last.
+    # Passages end with a full stop, so a run ends at the last word followed by one,
+    # and all their sentences but the last have as many words as the sentences of the
+    # punctuation templates, so a run ends after any other sentence
+    def __init__(self, lang, strict, loose):
+        self.lang = lang
+        self.strict = strict
+        self.loose = loose
+        self.marker = lang.marker.split(" ")
+        self.reset()
+
+    def reset(self):
+        self.start = None
+        self.pieces = []
+        self.size = 0
+        self.words = 0
+        self.end = 0
+        self.upto = 0
+        self.found = None
+        self.progress = 0
+        self.soft = None
+        self.last = False
+        self.stop = None
+
+    def sentence(self, at, sizes):
+        # a full stop at at: returns the run if the sentence ending there must be its last
+        if self.start is None or self.end != at:
+            return None
+        n = self.words - (self.stop[0] if self.stop else 0)
+        self.stop = (self.words, self.end)
+        if n in sizes and not self.last:
+            return None
+        return self.close()
+
+    def extend(self, piece, upto, max_chars):
+        if self.size is not None:
+            self.pieces.append(piece)
+            self.size += len(piece)
+            if self.size > max_chars:
+                # too long to be held, the passage is reported without its data
+                self.pieces = []
+                self.size = None
+        self.upto = upto
+
+    def close(self, rollback = False):
+        # the run as start, end, words, whether it holds the marker and its text, None
+        # when it was too long, and a new run started
+        if rollback and self.soft is not None:
+            self.words, self.end = self.soft
+        if self.stop is not None and self.stop[1] <= self.end:
+            self.words, self.end = self.stop
         else:
-            ter = self.chomp(1, "end")
-        cst = 0
-        if ter:
-            if self.finals_len > -1:
-                syl += self.lang.finals[self.chomp(self.finals_len, "final")]
-            syl += " "
-            self.syl_len = 0
-        self.first = ter
-        return syl
+            self.words = 0
+        out = None
+        if self.start is not None and self.words > 0:
+            text = None
+            if self.size is not None:
+                text = "".join(self.pieces)[:self.end - self.start]
+            out = (self.start, self.end, self.words, self.found is not None and self.found <= self.end, text)
+        self.reset()
+        return out
 
-    def add_dayada(self, s):
-        pos = .2 + .6*random.random()
-        spc = s.find(" ", int(pos * len(s)))
-        s = s[:spc] + " " + self.lang.marker + s[spc:]
-        return s
+    def word(self, w, s, e, capital, text, base, max_chars):
+        # takes the next word, from s to e, and returns the runs it ends
+        closed = []
+        if self.progress:
+            if w == self.marker[self.progress]:
+                self.extend(text[self.upto - base:e - base], e, max_chars)
+                self.words += 1
+                self.end = e
+                self.progress += 1
+                if self.progress == len(self.marker):
+                    self.found = e
+                    self.progress = 0
+                    self.soft = None
+                return closed
+            self.progress = 0
+            if self.soft is not None:
+                closed.append(self.close(True))
+        strict = self.strict.fullmatch(w) is not None
+        marker = w == self.marker[0]
+        if not (strict or marker or self.loose.fullmatch(w)):
+            closed.append(self.close())
+            return closed
+        if self.last:
+            # the word that could only be the last one wasn't
+            closed.append(self.close(True))
+        if self.start is None:
+            if not capital:
+                return closed
+            self.start = self.upto = s
+        soft = (self.words, self.end)
+        self.extend(text[self.upto - base:e - base], e, max_chars)
+        self.words += 1
+        self.end = e
+        if marker and len(self.marker) > 1:
+            self.progress = 1
+            self.soft = None if strict else soft
+        elif marker:
+            self.found = e
+        elif not strict:
+            self.soft = soft
+            self.last = True
+        return closed
 
-    def characteristic(self, punc):
-        res = 0
-        for p in punc:
-            if isinstance(p, int):
-                res += p
-        return res
+class scanner:
+    # finds the passages of Dayada text in a larger text in one pass: for every
+    # language at once, it follows the runs of words well formed in it from a
+    # capitalized one on, and decodes those that hold its marker, or, with marker
+    # False, those of min_words words at least. Only the current runs are held, up to
+    # max_chars characters each; longer passages are reported without their data
+    token_re = re.compile(r"(?P<word>[^\W\d_]+)|(?P<skip><[^>]*>|[\s,.!?;:'\"]+)|.", re.S)
+
+    def __init__(self, d, langs = None, marker = True, min_words = 8, max_chars = 1 << 20):
+        self.d = d
+        self.langs = [d.get_lang(l) for l in langs] if langs else list(d.langs)
+        self.marker = marker
+        self.min_words = min_words
+        self.max_chars = max_chars
+        self.rules = [self.rule(l) for l in self.langs]
+        # the number of words of the sentences of the punctuation templates
+        self.sizes = set()
+        for punc in d.puncts:
+            n = 0
+            for item in punc:
+                if isinstance(item, int):
+                    n += item
+                elif any(c in item for c in ".!?"):
+                    self.sizes.add(n)
+                    n = 0
+
+    @staticmethod
+    def rule(l):
+        # the words of l, strict for those followed by more and loose for the last,
+        # which can be cut short before its final
+        def alt(tokens):
+            out = "(?:" + "|".join(sorted((re.escape(t) for t in set(tokens) if t), key = len, reverse = True)) + ")"
+            return out + "?" if "" in tokens else out
+        ini = alt(l.initials) + "?" if l.initials else ""
+        syl = alt(l.consonants) + alt(l.vowels)
+        if l.matches:
+            syl = alt(l.matches) + "?" + syl
+        word = "{}(?:{}){{1,{}}}".format(ini, syl, l.syl_max_len)
+        fin = alt(l.finals) if l.finals else ""
+        return re.compile(word + fin), re.compile(word + fin + "?" if fin else word)
+
+    def scan(self, chunks, window = 65536):
+        # the passages in the str or bytes chunks, bytes being taken as UTF-8, with
+        # their offsets in characters
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        runs = [scanrun(l, *rule) for l, rule in zip(self.langs, self.rules)]
+        base = 0
+        held = ""
+        final = False
+        chunks = iter(chunks)
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+                chunk = ""
+            if not isinstance(chunk, str):
+                chunk = decoder.decode(chunk, final)
+            text = held + chunk
+            # the last word or tag may go on in the next chunk
+            cut = len(text)
+            if not final:
+                cut = max(text.rfind(c) for c in " \n\t\r")
+                lt = text.rfind("<")
+                if lt > text.rfind(">") and len(text) - lt < window:
+                    cut = min(cut, lt)
+                if cut <= 0:
+                    cut = 0 if len(text) < window else len(text)
+            for m in self.token_re.finditer(text, 0, cut):
+                if m.lastgroup == "word":
+                    w = m.group()
+                    s = base + m.start()
+                    # words can start with a letter without case, like the okina
+                    capital = not w[0].islower()
+                    upper = w.upper()
+                    for run in runs:
+                        # most words neither go on a run nor start one
+                        if run.start is None and not capital:
+                            continue
+                        for found in run.word(upper, s, s + len(w), capital, text, base, self.max_chars):
+                            yield from self.check(run.lang, found)
+                elif m.lastgroup == "skip" and ("." in m.group() or "!" in m.group() or "?" in m.group()):
+                    for run in runs:
+                        yield from self.check(run.lang, run.sentence(base + m.start(), self.sizes))
+                elif m.lastgroup is None:
+                    # anything but letters, spaces, punctuation and tags ends the runs
+                    for run in runs:
+                        if run.start is not None:
+                            yield from self.check(run.lang, run.close(run.progress > 0))
+            # the runs take the text they still need with them
+            for run in runs:
+                if run.start is not None:
+                    run.extend(text[run.upto - base:cut], base + cut, self.max_chars)
+            held = text[cut:]
+            base += cut
+        for run in runs:
+            yield from self.check(run.lang, run.close(run.progress > 0))
+
+    def check(self, lang, found):
+        if found is None:
+            return
+        start, end, words, marked, text = found
+        if not marked and (self.marker or words < self.min_words):
+            return
+        if text is None:
+            yield passage(start, end, lang.name, None)
+            return
+        # the decoder drops line breaks, which would join the words of wrapped lines
+        text = re.sub(r"\s+", " ", text)
+        try:
+            data = decompress(self.d.decodebytes(text, lang = lang))
+        except Exception:
+            # not a passage after all
+            return
+        yield passage(start, end, lang.name, bytes(data))
+
+class dayada:
+    # holds the settings only; the state of each encode or decode lives in its own
+    # encoder or decoder, so one instance can serve many threads at once
+    def __init__(self):
+        self.langs = list(langs)
+        self.puncts = [
+            [5, ", ", 8, ". ", 5, ', "', 6, '." '],
+            [6, ", ", 5, ", ", 7, ". "]
+        ];
+        self.marker = True
+        self.lang = None
+        self.trace = None
+        self.index = None
+        self.cipher = aesgcm()
+        self.compression = None
+        self.engine = None
+        self.seed = None
+        self.rng = random.Random()
+        self.cache = None
+        self.metrics = None
+        self.totals = None
+        self.auto = {"ascii": False, "marker": True, "max_word": None}
+        self.densest = {}
+
+    def get_index(self):
+        # rebuilt whenever languages were added to or removed from self.langs
+        if self.index is None or self.index.langs != tuple(self.langs):
+            self.index = langindex(self.langs)
+        return self.index
+
+    def guess_lang(self, text):
+        # the first language whose marker is in text, or None
+        found = self.get_index().find(text)
+        return found[0] if found else None
+
+    def rank_langs(self, text):
+        # all languages with the confidence that text is in them, best first
+        return self.get_index().rank(text)
+
+    def find_language(self, name):
+        for lang in self.langs:
+            if lang.name == name:
+                return lang
+        return None
+
+    def load_langs(self, path, cache = None):
+        # adds the languages of a file or directory, replacing those of the same name
+        loaded = load_langs(path, cache)
+        names = set(l.name for l in loaded)
+        self.langs = [l for l in self.langs if l.name not in names] + loaded
+        self.densest = {}
+        self.clear_cache()
+        return loaded
+
+    def get_langs(self):
+        return [lang.name for lang in self.langs]
+
+    def set_default_lang(self):
+        self.set_lang(self.get_langs()[0])
+
+    def set_lang(self, lang):
+        # a language, its name or "auto", see densest_lang()
+        if isinstance(lang, str) and lang != "auto":
+            lang = self.find_language(lang)
+        if not lang:
+            return
+        self.lang = lang
+
+    def get_lang(self, lang = None):
+        # the language for one call: the one given, else the one set, else the first
+        if lang is None:
+            lang = self.lang
+        if lang == "auto":
+            lang = self.densest_lang()
+        elif isinstance(lang, str):
+            name = lang
+            lang = self.find_language(name)
+            if lang is None:
+                raise Exception("Unknown language {}".format(name))
+        return lang if lang is not None else self.langs[0]
+
+    def set_auto_lang(self, ascii = False, marker = True, max_word = None):
+        # the constraints "auto" picks a language under: text in ASCII only, a marker
+        # that tells the language apart, words of at most max_word characters
+        self.auto = {"ascii": ascii, "marker": marker, "max_word": max_word}
+        self.densest = {}
+
+    def analyze(self, measure = 4096):
+        # the density of every language, densest first in UTF-8. measure is the size of
+        # the random payload encoded for the measured figures, 0 to skip them
+        data = random.Random(0).randbytes(measure)
+        out = []
+        for l in self.langs:
+            chars, utf8 = expect(l, self.puncts)
+            measured = [None, None]
+            if measure:
+                text = self.encode(data, lang = l, format = "bytes", compression = "none")
+                measured = [len(text) / measure, len(text.encode("utf-8")) / measure]
+            out.append(density(l.name, chars, utf8, *measured, l.allchars.isascii(), longest(l)))
+        return sorted(out, key = lambda d: d.utf8)
+
+    def densest_lang(self, **constraints):
+        # the language that writes the fewest UTF-8 bytes per byte of data and meets
+        # the constraints, those of set_auto_lang() unless given. The choice is kept
+        # until the languages, the punctuation or the constraints change
+        c = dict(self.auto, **constraints)
+        key = tuple(sorted(c.items()))
+        if key in self.densest:
+            return self.densest[key]
+        best = None
+        for l in self.langs:
+            if c["ascii"] and not l.allchars.isascii():
+                continue
+            if c["marker"] and self.get_index().find(l.marker)[:1] != [l]:
+                continue
+            if c["max_word"] is not None and longest(l) > c["max_word"]:
+                continue
+            utf8 = expect(l, self.puncts)[1]
+            if best is None or utf8 < best[0]:
+                best = (utf8, l)
+        if best is None:
+            raise Exception("No language meets the constraints")
+        self.densest[key] = best[1]
+        return best[1]
 
-    def add_punctuation(self, s):
-        s = s.strip()
-        l = s.split(' ')
-        res = ''
-        while len(l) > 0:
-            punctuation = random.choice(self.puncts)
-            if self.characteristic(punctuation) > len(l):
-                punctuation = [len(l), "."]
+    def set_marker(self, mark):
+        self.marker = mark
+        self.clear_cache()
+
+    def set_puncts(self, puncts):
+        # punctuation templates: lists of word counts and the separators that follow
+        # them, one of which is picked at random for each sentence. The decoder drops
+        # what no language writes, which has to leave a single space between words
+        letters = set("".join(l.allchars for l in self.langs))
+        for punc in puncts:
+            if not all(isinstance(p, str) or (isinstance(p, int) and p >= 0) for p in punc):
+                raise Exception("Punctuation templates take word counts and strings only")
+            if self.characteristic(punc) == 0:
+                raise Exception("Punctuation templates need at least one word")
+            if len(punc) % 2 or not all(isinstance(n, int) and n > 0 and isinstance(sep, str) for n, sep in zip(punc[::2], punc[1::2])):
+                raise Exception("Punctuation templates alternate word counts of at least one and separators")
+            for sep in punc[1::2]:
+                if "".join(c for c in sep if c == " " or c.upper() in letters) != " ":
+                    raise Exception("Separator {!r} doesn't leave one space between words".format(sep))
+        if not puncts:
+            raise Exception("At least one punctuation template is needed")
+        self.puncts = [list(punc) for punc in puncts]
+        self.densest = {}
+        self.clear_cache()
+
+    def set_trace(self, trace):
+        # a list to collect traceevents in, a callable to receive them, or None to
+        # switch tracing off. Can be overridden per call with the trace argument
+        self.trace = trace
+
+    def tracer(self, trace):
+        if trace is None:
+            trace = self.trace
+        if isinstance(trace, list):
+            return trace.append
+        return trace
+
+    def set_cipher(self, cipher):
+        # the encryption backend: aesgcm() by default, or simplecipher() for messages
+        # encrypted by earlier versions
+        self.cipher = cipher
+
+    def set_seed(self, seed):
+        # an int, str or bytes to write each payload the same way every time, whatever
+        # was encoded before, or None for the generator of the instance
+        if seed is not None and not isinstance(seed, (int, str, bytes)):
+            raise Exception("Seeds are ints, strings or bytes")
+        self.seed = seed
+        self.clear_cache()
+
+    def set_shared_random(self, shared = True):
+        # without a seed, makes the choices with the random module, so that
+        # random.seed() replays them, instead of with a generator of the instance
+        self.rng = random if shared else random.Random()
+
+    def get_random(self):
+        # the source of the choices of one call: a generator of its own when a seed is
+        # set, so that calls neither depend on nor disturb each other
+        return self.rng if self.seed is None else random.Random(self.seed)
+
+    def set_cache(self, max_bytes):
+        # caches up to max_bytes of payloads and texts, or none with 0 or None. Decodes
+        # are cached, encodes too when a seed is set; encryption never is
+        self.cache = lrucache(max_bytes) if max_bytes else None
+
+    def clear_cache(self):
+        # called by the setters whose settings change the texts
+        if self.cache is not None:
+            self.cache.clear()
+
+    def set_metrics(self, metrics):
+        # a callable to receive the record of every call, a dict of its op, language,
+        # seconds, seconds by stage, sizes and counts, or None
+        self.metrics = metrics
+
+    def set_stats(self, on = True):
+        # starts adding up the records of all calls for stats(), or stops with False
+        import threading
+        self.totals = {} if on else None
+        self.totals_lock = threading.Lock()
+
+    def stats(self):
+        # the records added up by op since set_stats(), along with the number of calls
+        if self.totals is None:
+            raise Exception("Stats are off, switch them on with set_stats()")
+        with self.totals_lock:
+            return {op: dict(total, stages = dict(total["stages"])) for op, total in self.totals.items()}
+
+    def get_meter(self, op, outer = None):
+        # the meter of an outer call, a new one, or idle when nothing takes the records
+        if outer is not None:
+            return outer
+        if self.totals is None and self.metrics is None:
+            return idle
+        return meter(self, op)
+
+    def collect(self, record):
+        totals = self.totals
+        if totals is not None:
+            with self.totals_lock:
+                total = totals.setdefault(record["op"], {"calls": 0, "stages": {}})
+                total["calls"] += 1
+                for k, v in record.items():
+                    if k == "stages":
+                        for stage, seconds in v.items():
+                            total["stages"][stage] = total["stages"].get(stage, 0) + seconds
+                    elif k not in ("op", "lang"):
+                        total[k] = total.get(k, 0) + v
+        if self.metrics is not None:
+            self.metrics(record)
+
+    def set_engine(self, engine):
+        # "numpy" for the NumPy encoder, "python" for the pure Python one, or None for
+        # NumPy if it is installed. Both write the same words; traced encodes always
+        # take the pure Python one
+        if engine not in ("numpy", "python", None):
+            raise Exception("Unknown engine {}".format(engine))
+        if engine == "numpy" and not has_numpy:
+            raise Exception("The NumPy engine needs numpy, install it first using 'pip3 install numpy'")
+        self.engine = engine
+
+    def get_encoder(self, lang, bits, trace = None):
+        # the encoder for one call, on a fresh bitreader or bitstream
+        emit = self.tracer(trace)
+        if emit is None and bits.pos == 0 and (self.engine == "numpy" or self.engine is None and has_numpy):
+            if isinstance(bits, bitstream):
+                return npencoder(lang, chain([bits.data], bits.chunks))
+            return npencoder(lang, [bits.data], bits.nbits)
+        return encoder(lang, bits, emit)
+
+    def get_sizer(self, lang, data):
+        # the sizer for one call, on the same engine as get_encoder()
+        if self.engine == "numpy" or self.engine is None and has_numpy:
+            return npsizer(lang, data)
+        return sizer(lang, bitreader(data))
+
+    def set_compression(self, compression):
+        # "zlib", "bz2", "lzma", "auto" for the one that does best, or None. Can be
+        # overridden per call with the compression argument, "none" switching it off.
+        # Compressed data is tagged, so decoding finds out by itself
+        if compression not in compressions and compression not in ("auto", "none", None):
+            raise Exception("Unknown compression {}".format(compression))
+        self.compression = compression
+        self.clear_cache()
+
+    def compressor(self, compression):
+        # the codec for one call, or None
+        if compression is None:
+            compression = self.compression
+        return None if compression == "none" else compression
+
+    def encrypt(self, pwd, data, lang = None, compression = None):
+        # the ciphertext goes straight into the encoder, as raw bytes. Data is
+        # compressed before it is encrypted, as ciphertext doesn't compress
+        m = self.get_meter("encrypt")
+        data = self.morph(data, "str", "bytes")
+        size = len(data)
+        m.lap("morph")
+        codec = self.compressor(compression)
+        data = compressed(data, codec)
+        if codec:
+            m.lap("compress")
+        data = self.cipher.encrypt(pwd, data)
+        m.lap("encrypt")
+        out = self.encodebytes(data, lang = lang, meter = m)
+        m.sizes(size)
+        m.stop()
+        return out
+
+    def decrypt(self, pwd, data, lang = None):
+        m = self.get_meter("decrypt")
+        data = self.decodebytes(data, lang = lang, meter = m)
+        data = self.cipher.decrypt(pwd, bytes(data))
+        m.lap("decrypt")
+        out = decompress(data)
+        m.lap("decompress")
+        m.sizes(output = len(out))
+        m.stop()
+        return out
+
+    def iterencrypt(self, pwd, source, chunk_size = 65536, lang = None, compression = None):
+        # encrypts and encodes a file object or an iterable of bytes/str chunks as they
+        # are read, like iterencode()
+        m = self.get_meter("encrypt")
+        codec = self.compressor(compression)
+        chunks = m.timed("read", readchunks(source, chunk_size), "compress" if codec else "encrypt", size = "input_size")
+        chunks = m.timed("compress", compresschunks(chunks, codec), "encrypt") if codec else compresschunks(chunks, None)
+        chunks = m.timed("encrypt", self.cipher.iterencrypt(pwd, chunks), "words")
+        enc = self.get_encoder(self.get_lang(lang), bitstream(chunks))
+        yield from m.handout("format", self.iterformat(enc, meter = m), True, "output_size")
+
+    def iterdecrypt(self, pwd, source, chunk_size = 65536, lang = None):
+        m = self.get_meter("decrypt")
+        chunks = m.timed("decrypt", self.cipher.iterdecrypt(pwd, self.iterdecode(source, chunk_size, lang, m)), "decompress")
+        yield from m.handout("decompress", decompresschunks(chunks), True, "output_size")
+
+    def encode(self, data, trace = None, lang = None, format = None, compression = None):
+        m = self.get_meter("encode")
+        data = self.morph(data, format, "bytes")
+        size = len(data)
+        m.lap("morph")
+        codec = self.compressor(compression)
+        lang = self.get_lang(lang)
+        key = None
+        if self.cache is not None and self.seed is not None and self.tracer(trace) is None:
+            key = ("encode", lang, codec, bytes(data))
+            out = self.cache.get(key)
+            m.lap("cache")
+            if out is not None:
+                m.lang = lang.name
+                m.add({"cache_hits": 1})
+                m.sizes(size, len(out))
+                m.stop()
+                return out
+        data = compressed(data, codec)
+        if codec:
+            m.lap("compress")
+        out = self.encodebytes(data, trace, lang, m)
+        if key is not None:
+            self.cache.put(key, out, len(key[3]) + len(out))
+            m.lap("cache")
+        m.sizes(size)
+        m.stop()
+        return out
+
+    def encodebytes(self, b, trace = None, lang = None, meter = None):
+        return self.encodebits(bitreader(b), trace, lang, meter)
+
+    def encodehex(self, h, trace = None, lang = None, meter = None):
+        return self.encodebits(bitreader(bytes.fromhex(h + "0" * (len(h) % 2)), 4 * len(h)), trace, lang, meter)
+
+    def encodebits(self, bits, trace = None, lang = None, meter = None):
+        # meter is that of the call this one is part of, if any
+        m = self.get_meter("encode", meter)
+        lang = self.get_lang(lang)
+        m.lang = lang.name
+        enc = self.get_encoder(lang, bits, trace)
+        # the marker goes in the first words, as iterencode() puts it, for the guess of
+        # the streaming decoder only looks at the start of the text
+        out = "".join(self.iterformat(enc, meter = m))
+        m.lap("format")
+        m.sizes((bits.nbits + 7) // 8, len(out))
+        if meter is None:
+            m.stop()
+        return out
+
+    def iterencode(self, source, chunk_size = 65536, lang = None, compression = None):
+        # encodes a file object or an iterable of bytes/str chunks, yielding the text a
+        # sentence at a time. Only the bit buffer, the syllable state and a window of
+        # words are held, whatever the size of the input
+        m = self.get_meter("encode")
+        codec = self.compressor(compression)
+        chunks = m.timed("read", readchunks(source, chunk_size), "compress" if codec else "words", size = "input_size")
+        chunks = m.timed("compress", compresschunks(chunks, codec), "words") if codec else compresschunks(chunks, None)
+        enc = self.get_encoder(self.get_lang(lang), bitstream(chunks))
+        yield from m.handout("format", self.iterformat(enc, meter = m), True, "output_size")
+
+    def iterformat(self, enc, window = 256, meter = None, marker = None, rng = None):
+        # applies the marker, punctuation and capitalization to the words of an encoder
+        # in one pass. The marker goes after the word at 20% to 80% of the length of the
+        # first window words, or of all words if window is None. marker and rng, when
+        # given, take the place of the settings
+        if meter is None:
+            meter = idle
+        meter.lang = enc.lang.name
+        if rng is None:
+            rng = self.get_random()
+        words = meter.timed("words", enc.words(), "format", "words", done = enc.counts)
+        buf = deque(words if window is None else islice(words, window + 1))
+        # no words, no sentence, not even a full stop
+        if not buf:
+            return
+        if self.marker if marker is None else marker:
+            pos = .2 + .6*rng.random()
+            length = sum(map(len, buf)) + len(buf)
+            if window is None or len(buf) <= window:
+                length -= enc.partial
+            spc = int(pos * length)
+            at = len(buf)
+            end = -1
+            for i, w in enumerate(buf):
+                end += len(w) + 1
+                if end >= spc:
+                    at = i + 1
+                    break
+            # the decoder only drops the marker when a word follows it
+            at = max(min(at, len(buf) - 1), 0)
+            for i, w in enumerate(enc.lang.marker.split(" ")):
+                buf.insert(at + i, w)
+        templates = [(p, self.characteristic(p)) for p in self.puncts]
+        uc = ('. ', '! ', '? ', ', "', '." ', ">")
+        tail = ""
+        cap = True
+        while True:
+            punctuation, need = rng.choice(templates)
+            while len(buf) < need:
+                w = next(words, None)
+                if w is None:
+                    break
+                buf.append(w)
+            if need > len(buf):
+                punctuation = [len(buf), "."]
+            out = []
             for item in punctuation:
                 if isinstance(item, int):
-                    res += " ".join(l[:item])
-                    l = l[item:]
+                    # words are letters only, so just their first one can follow a separator
+                    text = " ".join([buf.popleft() for i in range(item)]).lower()
+                    if cap and text:
+                        text = text[0].upper() + text[1:]
+                        cap = False
+                    out.append(text)
+                    tail = (tail + text)[-3:]
                 else:
-                    res += item
-        return res
+                    for c in item.lower():
+                        if cap:
+                            c = c.upper()
+                        out.append(c)
+                        tail = (tail + c)[-3:]
+                        cap = tail.endswith(uc)
+            yield "".join(out)
+            if not buf:
+                w = next(words, None)
+                if w is None:
+                    return
+                buf.append(w)
 
-    def add_capitalization(self, s):
-        # make everything lowercase, except after .!?, or after ', "' and '."'
-        if len(s) > 1:
-            s = s[0].upper() + s[1:].lower()
-        else:
-            s = s.upper()
-        uc = ['. ', '! ', '? ', ', "', '." ', ">"]
-        for up in uc:
-            pos = 0
+    def iterdecode(self, source, chunk_size = 65536, lang = None, meter = None):
+        # decodes a file object or an iterable of str/bytes chunks, bytes being taken as
+        # UTF-8, and yields the data as it is decoded. The text is held from the cursor
+        # up to the next vowel, the output from the last nibble padding could start at
+        m = self.get_meter("decode", meter)
+        dec = decoder(self.get_lang(lang), m.timedcall("guess_lang", self.guess_lang, "decode"), self.tracer(None))
+        dec.stream(m.timed("read", readchunks(source, chunk_size), "decode", size = "input_size"))
+        def done():
+            m.lang = dec.lang.name
+            return dec.counts()
+        # within iterdecrypt(), the data goes on to be decrypted
+        data = decompresschunks(m.timed("decode", dec.iterrun(), "decompress" if meter is None else "decrypt", done = done))
+        if meter is None:
+            data = m.handout("decompress", data, True, "output_size")
+        yield from data
+
+    def decode(self, yada, format = "hex", trace = None, lang = None):
+        m = self.get_meter("decode")
+        key = None
+        if self.cache is not None and self.tracer(trace) is None and isinstance(yada, (str, bytes)):
+            key = ("decode", self.get_lang(lang), format, yada)
+            out = self.cache.get(key)
+            m.lap("cache")
+            if out is not None:
+                m.lang = key[1].name
+                m.add({"cache_hits": 1})
+                m.sizes(len(yada), len(out))
+                m.stop()
+                return out
+        data = self.decodebytes(yada, trace, lang, m)
+        data = decompress(data)
+        m.lap("decompress")
+        m.sizes(output = len(data))
+        # a copy that can't change under the caller, decodebytes() returns the buffer
+        out = bytes(data) if format == "bytes" else self.morph(data, "bytes", format)
+        m.lap("morph")
+        if key is not None:
+            self.cache.put(key, out, len(yada) + len(out))
+            m.lap("cache")
+        m.stop()
+        return out
+
+    def decodehex(self, yada, trace = None, lang = None, meter = None):
+        out = self.decodebits(yada, trace, lang, meter)
+        return out.data.hex()[:out.nibbles]
+
+    def decodebytes(self, yada, trace = None, lang = None, meter = None):
+        # returns the bytearray the bits were decoded into, without copying it
+        out = self.decodebits(yada, trace, lang, meter)
+        if out.nibbles & 1:
+            raise Exception("Decoded data does not end on a byte boundary")
+        return out.data
+
+    def decodebits(self, yada, trace = None, lang = None, meter = None):
+        # the language is guessed from the marker, lang is only the fallback. meter is
+        # that of the call this one is part of, if any
+        m = self.get_meter("decode", meter)
+        dec = decoder(self.get_lang(lang), m.timedcall("guess_lang", self.guess_lang, "decode"), self.tracer(trace))
+        dec.load(yada)
+        dec.run()
+        m.lap("decode")
+        m.lang = dec.lang.name
+        m.add(dec.counts())
+        m.sizes(len(yada), (dec.out.nibbles + 1) // 2)
+        if meter is None:
+            m.stop()
+        return dec.out
+
+    def predict(self, data, lang = None, format = None, compression = None):
+        # the size of the text encode() would write for data, see prediction, worked
+        # out from the lengths of its words without writing them
+        data = self.morph(data, format, "bytes")
+        data = compressed(data, self.compressor(compression))
+        lang = self.get_lang(lang)
+        return self.sized(lang, *self.get_sizer(lang, data).run())
+
+    def sized(self, lang, words, chars, utf8):
+        # the prediction for the words of a sizer, with the marker and the punctuation
+        rng = None if self.seed is None else self.get_random()
+        if self.marker:
+            marker = lang.marker.lower().split(" ")
+            words += len(marker)
+            chars += sum(len(w) for w in marker)
+            utf8 += sum(len(w.encode("utf-8")) for w in marker)
+            if rng is not None:
+                # iterformat() draws the place of the marker first
+                rng.random()
+        least, most = self.spread(words, rng)
+        return prediction(words, chars + least[0], chars + most[0], utf8 + least[1], utf8 + most[1])
+
+    def spread(self, n, rng = None):
+        # the characters and UTF-8 bytes the punctuation adds to n words, as the least
+        # and the most the templates can add, or both as the choices of rng make them
+        templates = []
+        for punc in self.puncts:
+            chars = utf8 = 0
+            for item in punc:
+                if isinstance(item, int):
+                    # the spaces between the words
+                    chars += max(item - 1, 0)
+                    utf8 += max(item - 1, 0)
+                else:
+                    chars += len(item)
+                    utf8 += len(item.encode("utf-8"))
+            templates.append((self.characteristic(punc), chars, utf8))
+        if rng is not None:
+            added = [0, 0]
+            while n > 0:
+                need, chars, utf8 = rng.choice(templates)
+                if need > n:
+                    # the last sentence: its words and a full stop
+                    return (added[0] + n, added[1] + n), (added[0] + n, added[1] + n)
+                added = [added[0] + chars, added[1] + utf8]
+                n -= need
+            return tuple(added), tuple(added)
+        # the least and the most for every count of words up to a few sentences. Past
+        # those, the templates with the fewest and the most characters per word are
+        # among the choices that make the least and the most, so each of their words
+        # adds the same
+        longest = max(t[0] for t in templates)
+        upto = min(n, longest * longest + longest)
+        table = [(0, 0, 0, 0)]
+        for m in range(1, upto + 1):
+            best = None
+            for need, chars, utf8 in templates:
+                if need > m:
+                    o = (m, m, m, m)
+                else:
+                    p = table[m - need]
+                    o = (p[0] + chars, p[1] + chars, p[2] + utf8, p[3] + utf8)
+                best = o if best is None else (min(best[0], o[0]), max(best[1], o[1]), min(best[2], o[2]), max(best[3], o[3]))
+            table.append(best)
+        out = []
+        for i, pick in enumerate((min, max, min, max)):
+            t = pick(templates, key = lambda t: t[1 + i // 2] / t[0])
+            k = max(0, -(-(n - upto) // t[0]))
+            out.append(table[n - k * t[0]][i] + k * t[1 + i // 2])
+        return (out[0], out[2]), (out[1], out[3])
+
+    def segment(self, lang = None):
+        # the characters of an SMS the texts of lang fit in: 160 if all of its letters,
+        # in either case, and the punctuation are in the GSM 7-bit alphabet, else 70
+        lang = self.get_lang(lang)
+        chars = lang.allchars.lower() + lang.allchars.upper() + "".join(p for punc in self.puncts for p in punc if isinstance(p, str))
+        return 160 if all(c in gsm7 for c in chars) else 70
+
+    def split(self, data, limit = None, lang = None, format = None):
+        # cuts data into pieces whose texts have limit characters at most, by default
+        # those of an SMS, see segment(), and returns the texts. Each decodes on its
+        # own, and the data of all of them, joined in order, is data. The pieces are
+        # sized on predict(), so only the texts returned are written; without a seed,
+        # for the longest text they can give. Pieces aren't compressed, so that each
+        # can be decoded alone
+        data = self.morph(data, format, "bytes")
+        lang = self.get_lang(lang)
+        if limit is None:
+            limit = self.segment(lang)
+        fits = lambda k: self.sized(lang, *self.get_sizer(lang, compressed(data[pos:pos + k], None)).run()).max_chars <= limit
+        texts = []
+        pos = 0
+        while pos < len(data) or not texts:
+            left = len(data) - pos
+            if not fits(min(left, 1)):
+                raise Exception("Texts of {} characters cannot hold a byte of data".format(limit))
+            # the longest piece that fits: doubled until it doesn't, then halved back
+            lo, hi = min(left, 1), left + 1
+            k = 2
+            while k < hi:
+                if not fits(k):
+                    hi = k
+                    break
+                lo = k
+                k *= 2
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if fits(mid):
+                    lo = mid
+                else:
+                    hi = mid
+            texts.append(self.encode(data[pos:pos + lo], lang = lang, format = "bytes", compression = "none"))
+            pos += lo
+        return texts
+
+    def get_wordgen(self, lang, n, min_syl, max_syl, seed, unique):
+        # the word generator for one call, on the same engine as get_encoder(), seeded
+        # by the instance seed unless given one
+        numpy = self.engine == "numpy" or self.engine is None and has_numpy
+        return wordgen(self.get_lang(lang), n, min_syl, max_syl, self.seed if seed is None else seed, unique, numpy)
+
+    def generate_words(self, lang = None, n = 1, min_syl = 1, max_syl = None, seed = None, unique = False):
+        # n random words of lang, for names and identifiers, see wordgen. They are drawn
+        # from the language tables, many times faster than encoding random data. The
+        # same seed gives the same words on the same engine
+        return self.get_wordgen(lang, n, min_syl, max_syl, seed, unique).words()
+
+    def generate_text(self, lang = None, n = 100, min_syl = 1, max_syl = None, seed = None, unique = False):
+        # filler text of n random words, punctuated and capitalized like encoded text
+        # but without a marker, yielded a sentence at a time
+        gen = self.get_wordgen(lang, n, min_syl, max_syl, seed, unique)
+        return self.iterformat(gen, marker = False, rng = gen.rng)
+
+    def encode_many(self, messages, lang = None, workers = None, chunksize = 64, return_exceptions = False):
+        # encodes independent messages on a pool of worker processes, yielding the texts
+        # in the order of messages. workers = 0 encodes in this process instead. With
+        # return_exceptions, a message that fails yields its exception rather than
+        # ending the run
+        return self.run_many("encode", messages, (), lang, workers, chunksize, return_exceptions)
+
+    def decode_many(self, messages, format = "hex", lang = None, workers = None, chunksize = 64, return_exceptions = False):
+        return self.run_many("decode", messages, (format,), lang, workers, chunksize, return_exceptions)
+
+    def run_many(self, method, messages, args, lang, workers, chunksize, return_exceptions):
+        lang = self.get_lang(lang)
+        if workers == 0:
+            call = getattr(self, method)
+            yield from callbatch(lambda m, *args: call(m, *args, lang = lang), messages, args, return_exceptions)
+            return
+        workers = workers or os.cpu_count() or 1
+        messages = iter(messages)
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers, initializer = initworker, initargs = (self.langs, lang, self.marker, self.puncts, self.compression, self.seed))
+        try:
+            # messages are sent chunksize at a time, with a few chunks per worker in
+            # flight, so that neither the input nor the results pile up
+            pending = deque()
             while True:
-                pos = s.find(up, pos)
-                if pos == -1:
+                while len(pending) < 2 * workers:
+                    batch = list(islice(messages, chunksize))
+                    if not batch:
+                        break
+                    pending.append(pool.submit(workbatch, method, batch, args, return_exceptions))
+                if not pending:
                     break
-                np = pos + len(up)
-                if np < len(s):
-                    s = s[:np] + s[np].upper() + s[np + 1:]
-                pos += 1
-        return s
+                yield from pending.popleft().result()
+        finally:
+            pool.shutdown(cancel_futures = True)
 
-    def chomp(self, b, part):
-        if len(self.hexdata) == 0:
-            if "1" not in self.bindata or "0" not in self.bindata:
-                self.terminate = True
+    def encodeframes(self, source, frame_size = 4096, chunk_size = 65536, lang = None, workers = None, chunksize = 4):
+        # encodes a file object or an iterable of bytes/str chunks as frames of
+        # frame_size bytes, see framer, and yields their texts in order. Join them
+        # with blank lines to keep them apart. The frames are encoded like
+        # encode_many() does
+        frames = framer(frame_size).split(readchunks(source, chunk_size))
+        return self.run_many("encodebytes", frames, (), lang, workers, chunksize, False)
+
+    def decodeframe(self, text, lang = None):
+        return framer.unpack(self.decodebytes(text, lang = lang))
+
+    def decodeframes(self, texts, lang = None, workers = None, chunksize = 4, return_exceptions = False):
+        # decodes the paragraphs of framed text, or an iterable of them, like
+        # decode_many() does and yields their frames in the same order
+        if isinstance(texts, str):
+            texts = paragraphs([texts])
+        return self.run_many("decodeframe", texts, (), lang, workers, chunksize, return_exceptions)
+
+    def joinframes(self, frames):
+        # yields the data of decoded frames in order, holding back those that come
+        # early. Exceptions among frames, from decodeframes() with return_exceptions,
+        # count as missing frames, which are all listed at the end
+        held = {}
+        seq = 0
+        total = None
+        for f in frames:
+            if isinstance(f, Exception):
+                continue
+            if f.last:
+                total = f.seq + 1
+            if f.seq >= seq:
+                # repeated frames, sent again for one that got lost, are dropped
+                held.setdefault(f.seq, f)
+            while seq in held and (total is None or seq < total):
+                yield held.pop(seq).data
+                seq += 1
+        if total is None or seq < total:
+            end = total if total is not None else max(held, default = seq) + 1
+            missing = [str(s) for s in range(seq, end) if s not in held]
+            if total is None:
+                missing.append("the last")
+            raise Exception("Missing or corrupted frames: {}".format(", ".join(missing)))
+
+    def frameindex(self, texts, lang = None, frame_size = None):
+        # random access to framed text, see frameindex
+        return frameindex(self, texts, lang, frame_size)
+
+    def scan(self, source, langs = None, marker = True, chunk_size = 65536):
+        # the passages of Dayada text in a file object, str or bytes, or an iterable of
+        # chunks, see scanner. Offsets are in characters
+        return scanner(self, langs, marker).scan(readchunks(source, chunk_size))
+
+    def scanfile(self, path, langs = None, marker = True):
+        # the passages of a file, as a list
+        with open(path, "rb") as f:
+            try:
+                source = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # empty files can't be mapped
+                return list(self.scan(f, langs, marker))
+            try:
+                return list(self.scan(source, langs, marker))
+            finally:
+                source.close()
+
+    def scanfiles(self, paths, langs = None, marker = True, workers = None, return_exceptions = False):
+        # the passages of many files, as (path, passage) pairs in the order of paths,
+        # the files being scanned on a pool of processes, or in this one with workers
+        # = 0. With return_exceptions, a file that can't be read yields (path, error)
+        paths = list(paths)
+        if workers == 0:
+            found = callbatch(self.scanfile, paths, (langs, marker), return_exceptions)
         else:
-            while len(self.bindata) < b:
-                h = self.hexdata[0]
-                self.hexdata = self.hexdata[1:]
-                self.bindata += self.bin2num_hex2bin(h)
-                if len(self.hexdata) == 0:
-                    if (self.bindata[-1] == "0"):
-                        self.bindata = self.bindata + "1111111111111111111111"
-                    else:
-                        self.bindata = self.bindata + "0000000000000000000000"
-        out = self.bindata[:b]
-        self.bindata = self.bindata[b:]
-        self.bindata_cache += out + " " + part + " "
-        return self.bin2num_bin2num(out)
-        
-    def bin2num_bin2num(self, b):
-        res = 0
-        for c in b:
-            res = 2 * res + (ord(c) - 48)
-        return res
+            found = self.run_many("scanfile", paths, (langs, marker), None, workers, 1, return_exceptions)
+        for path, passages in zip(paths, found):
+            if isinstance(passages, Exception):
+                yield path, passages
+            else:
+                for p in passages:
+                    yield path, p
 
-    def bin2num_num2bin(self, num, l):
-        num = int(num)
-        p = int(math.pow(2,l-1))
-        res = ""
-        for i in range(l):
-            bit = int(num / p)
-            res += str(bit)
-            num -= p * bit
-            p /= 2
-        return res
+    def get_assembly(self, events = None):
+        # renders traceevents, by default those collected in the instance trace list
+        if events is None:
+            events = self.trace if isinstance(self.trace, list) else []
+        return "".join(e.bits + " " + e.part + " " for e in events)
 
-    def bin2num_hex2bin(self, char):
-        code = ord(char[0]) - 48
-        if code > 9:
-            code -= 39
-        return self.bin2num_num2bin(code, 4)
+    def characteristic(self, punc):
+        res = 0
+        for p in punc:
+            if isinstance(p, int):
+                res += p
+        return res
 
-    def bin2num_bin2hex(self, s):
-        return "0123456789abcdef"[self.bin2num_bin2num(s)]
-    
     def morph(self, data, from_format, to_format):
+        # bytes-like data (bytes, bytearray, memoryview, mmap) is passed on without a
+        # copy wherever the formats allow. Give from_format to skip the guessing
         if from_format == None:
             if isinstance(data, str):
                 from_format = "str"
-                # guess
-                if re.match("^[0-9A-Fa-f]*$", data) and len(data) % 2 == 0:
+                # guess, in one pass: the group only matches if there is a non-hex letter
+                m = re.match("[0-9A-Fa-f]*([G-Zg-z_=][0-9A-Za-z_=]*)?$", data)
+                if m and m.group(1) is None and len(data) % 2 == 0:
                     from_format = "hex"
-                elif re.match("^[0-9A-Za-z_=]*$", data):
+                elif m:
                     from_format = "base64"
             else:
                 from_format = "bytes"
@@ -481,19 +2800,148 @@ class dayada:
         if to_format == "base64":
             data = b64encode(data).decode()
         elif to_format == "hex":
-            data = hexlify(data).decode()
+            data = memoryview(data).hex()
         elif to_format == "str":
             if type(data) != str:
                 data = str(data, "utf-8")
         elif to_format == "bytes":
-            if type(data) != bytes:
+            if isinstance(data, str):
                 data = bytes(data, "utf-8")
 
         return data
 
+# the engine of a pool worker, set up once per process by initworker()
+worker = None
+
+def initworker(langs, lang, marker, puncts, compression, seed):
+    global worker
+    # made after the fork, so each worker punctuates with a generator of its own
+    worker = dayada()
+    worker.langs = list(langs)
+    worker.lang = lang
+    worker.marker = marker
+    worker.puncts = puncts
+    worker.compression = compression
+    worker.seed = seed
+
+def workbatch(method, batch, args, return_exceptions):
+    return list(callbatch(getattr(worker, method), batch, args, return_exceptions))
+
+def callbatch(call, batch, args, return_exceptions):
+    # a message that is an exception, one that couldn't be read, is its own result
+    for m in batch:
+        try:
+            if isinstance(m, Exception):
+                raise m
+            out = call(m, *args)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            out = e
+        yield out
+
+def scanmain(argv):
+    # pydayada scan: the passages found in the files given, one JSON line each
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(prog = "pydayada scan")
+    parser.add_argument('-l', '--language', action='append') # only looks for these languages, can be repeated
+    parser.add_argument('-L', '--langs', action='append') # a language file or directory, can be repeated
+    parser.add_argument('-f', '--output_format', choices=['str', 'base64', 'hex'], default="str")
+    parser.add_argument('-w', '--workers', type=int)
+    parser.add_argument('--no-marker', action='store_true') # also finds passages without a marker
+    parser.add_argument('files', nargs='+')
+    o = parser.parse_args(argv)
+
+    d = dayada()
+    for path in o.langs or []:
+        d.load_langs(path)
+    for path, p in d.scanfiles(o.files, o.language, not o.no_marker, o.workers, return_exceptions = True):
+        out = {"file": path}
+        if isinstance(p, Exception):
+            out["error"] = str(p)
+        else:
+            out.update(start = p.start, end = p.end, lang = p.lang)
+            try:
+                out["data"] = None if p.data is None else d.morph(p.data, "bytes", o.output_format)
+            except UnicodeDecodeError:
+                out["error"] = "The data is not text, use the base64 or hex output format"
+        print(json.dumps(out, ensure_ascii = False))
+    return 0
+
+def analyzemain(argv):
+    # pydayada analyze: the density of the languages, and of those in the files given
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(prog = "pydayada analyze")
+    parser.add_argument('langs', nargs='*') # language files or directories
+    o = parser.parse_args(argv)
+
+    d = dayada()
+    for path in o.langs:
+        d.load_langs(path)
+    print(json.dumps([x._asdict() for x in d.analyze()], indent = 2))
+    return 0
+
+def generatemain(argv):
+    # pydayada generate: random words, one a line, or filler text, as they are drawn
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog = "pydayada generate")
+    parser.add_argument('-l', '--language', default="en")
+    parser.add_argument('-L', '--langs', action='append') # a language file or directory, can be repeated
+    parser.add_argument('-n', '--count', type=int, default=10)
+    parser.add_argument('--min-syl', type=int, default=1)
+    parser.add_argument('--max-syl', type=int)
+    parser.add_argument('-s', '--seed')
+    parser.add_argument('-u', '--unique', action='store_true')
+    parser.add_argument('-t', '--text', action='store_true') # punctuated sentences instead of a word a line
+    o = parser.parse_args(argv)
+
+    d = dayada()
+    for path in o.langs or []:
+        d.load_langs(path)
+    if o.language not in d.get_langs():
+        print("Unknown language", o.language, file = sys.stderr)
+        return 1
+    try:
+        if o.text:
+            for sentence in d.generate_text(o.language, o.count, o.min_syl, o.max_syl, o.seed, o.unique):
+                sys.stdout.write(sentence)
+            sys.stdout.write("\n")
+        else:
+            words = d.generate_words(o.language, o.count, o.min_syl, o.max_syl, o.seed, o.unique)
+            while True:
+                batch = list(islice(words, wordgen.batch))
+                if not batch:
+                    break
+                sys.stdout.write("\n".join(batch) + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader had enough, like head does; stdout is pointed at nothing so that
+        # closing it doesn't fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except Exception as e:
+        print(e, file = sys.stderr)
+        return 1
+    return 0
+
 def main():
     import argparse
+    import json
     import sys
+    if sys.argv[1:2] == ["bench"]:
+        from .bench import main as bench
+        sys.exit(bench(sys.argv[2:]))
+    if sys.argv[1:2] == ["scan"]:
+        sys.exit(scanmain(sys.argv[2:]))
+    if sys.argv[1:2] == ["generate"]:
+        sys.exit(generatemain(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        from .serve import main as serve
+        sys.exit(serve(sys.argv[2:]))
+    if sys.argv[1:2] == ["analyze"]:
+        sys.exit(analyzemain(sys.argv[2:]))
     loglmap = {"NOTSET": logging.NOTSET, "DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR, "CRITICAL": logging.CRITICAL}
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--encode', action='store_true')
@@ -501,10 +2949,22 @@ def main():
     parser.add_argument('-y', '--decrypt', action='store_true')
     parser.add_argument('-d', '--decode', action='store_true')
     parser.add_argument('-p', '--password')
-    parser.add_argument('-l', '--language', default="en")
+    parser.add_argument('-l', '--language', default="en") # or auto, for the densest language
+    parser.add_argument('--ascii', action='store_true') # auto only picks languages written in ASCII
+    parser.add_argument('--max-word', type=int) # auto only picks languages with words this long at most
+    parser.add_argument('-L', '--langs', action='append') # a language file or directory, can be repeated
     parser.add_argument('-o', '--output') # the default output is stdout, which doesn't need to be specified
     parser.add_argument('-f', '--output_format', choices=['bytes', 'str', 'base64', 'hex'])
     parser.add_argument('-F', '--input_format', choices=['bytes', 'str', 'base64', 'hex'], default="str")
+    parser.add_argument('-b', '--batch', action='store_true') # JSON Lines in and out, one message per line
+    parser.add_argument('-w', '--workers', type=int)
+    parser.add_argument('-s', '--seed') # writes the same input the same way every time
+    parser.add_argument('-r', '--frames', action='store_true') # framed text
+    parser.add_argument('--frame-size', type=int, default=4096) # the bytes of a frame when encoding
+    parser.add_argument('-z', '--compress', action='store_true') # the same as --compression auto
+    parser.add_argument('--cipher', choices=['aes', 'simplecrypto'], default='aes') # simplecrypto for texts encrypted by earlier versions
+    parser.add_argument('--compression', choices=['none', 'zlib', 'bz2', 'lzma', 'auto']) # compressed data is found when decoding
+    parser.add_argument('--stats', action='store_true') # the time and counts by stage, as JSON on stderr
     parser.add_argument('--loglevel', choices=loglmap.keys(), default="INFO")
     parser.add_argument('infile', default='-')
     o = parser.parse_args()
@@ -521,34 +2981,139 @@ def main():
         abort("Only one operating mode can be specified")
     if (o.encrypt or o.decrypt) and o.password is None:
         abort("Encryption and decryption require a password (-p or --password option)")
+    if o.batch and not (o.encode or o.decode):
+        abort("Batch mode only encodes or decodes")
+    if o.compress and o.compression is None:
+        o.compression = "auto"
+    if o.frames and not (o.encode or o.decode) or o.frames and o.batch:
+        abort("Framed text is only encoded or decoded, outside of batch mode")
+    if o.frames and o.compression not in (None, "none"):
+        abort("Framed text can't be compressed, as its frames are read one by one")
+    if o.batch and o.output_format == "bytes":
+        abort("Batch mode writes JSON, use the str, base64 or hex output format")
 
-    if (o.encrypt or o.decrypt) and not has_crypto:
-        abort("Encryption/decryption selected by simplecrypto library not found. Install simplecrypto first using 'pip3 install simplecrypto'")
+    if (o.encrypt or o.decrypt) and not has_aes:
+        abort("Encryption/decryption selected but pycryptodome library not found. Install pycryptodome first using 'pip3 install pycryptodome'")
+    if (o.encrypt or o.decrypt) and o.cipher == "simplecrypto" and not has_crypto:
+        abort("The simplecrypto cipher needs the simplecrypto library. Install it first using 'pip3 install simplecrypto'")
 
     d = dayada()
+    for path in o.langs or []:
+        d.load_langs(path)
     langs = [l.name for l in d.langs]
-    if o.language not in langs:
+    if o.language not in langs and o.language != "auto":
         abort("Unknown language", o.language)
 
-    if o.infile == '-':
-        data = sys.stdin.read()
-    else:
-        with open(o.infile, 'rb') as f:
-            data = f.read()
+    d.set_auto_lang(o.ascii, True, o.max_word)
     d.set_lang(o.language)
-    if o.encode:
-        out = d.encode(d.morph(data, o.input_format, "hex"))
-    elif o.decode:
-        out = d.decode(data, o.output_format)
-    elif o.encrypt:
-        out = d.encrypt(o.password, d.morph(data, o.input_format, "bytes"))
-    elif o.decrypt:
-        out = d.morph(d.decrypt(o.password, data), None, o.output_format)
-    if o.output == '-' or o.output is None:
-        print(out)
-    else:
-        with open(o.output, 'wb') as f:
-            f.write(out)
+    if o.cipher == "simplecrypto":
+        d.set_cipher(simplecipher())
+    d.set_compression(o.compression)
+    d.set_seed(o.seed)
+    if o.stats:
+        d.set_stats()
+    infile = sys.stdin.buffer if o.infile == '-' else open(o.infile, 'rb')
+    # files are mapped rather than read, and cut into chunks without copies
+    source = infile
+    if infile is not sys.stdin.buffer:
+        try:
+            source = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files and pipes can't be mapped
+            pass
+    tty = o.output == '-' or o.output is None
+    outfile = sys.stdout.buffer if tty else open(o.output, 'wb')
+
+    def write(chunks, to_format = None):
+        # writes out chunks of text or data as they come, carrying over the bytes that
+        # don't fill a base64 group yet
+        rest = b""
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                outfile.write(chunk.encode("utf-8"))
+            elif to_format == "hex":
+                outfile.write(chunk.hex().encode())
+            elif to_format == "base64":
+                chunk = rest + chunk
+                cut = len(chunk) - len(chunk) % 3
+                outfile.write(b64encode(chunk[:cut]))
+                rest = chunk[cut:]
+            else:
+                outfile.write(chunk)
+        if rest:
+            outfile.write(b64encode(rest))
+        if tty:
+            outfile.write(b"\n")
+
+    def batch(run):
+        # each line is a JSON string or an object with a data field. The result replaces
+        # the data, or an error field does if the message can't be converted
+        items = deque()
+        def messages():
+            for line in infile:
+                if line.strip():
+                    item = None
+                    try:
+                        item = json.loads(line)
+                        if isinstance(item, dict) and "data" not in item:
+                            raise Exception("Message has no data field")
+                        data = item["data"] if isinstance(item, dict) else item
+                        data = d.morph(data, o.input_format, "bytes") if o.encode else data
+                    except Exception as e:
+                        # only this line gets the error
+                        data = e
+                    items.append(item)
+                    yield data
+        for out in run(messages(), workers = o.workers, return_exceptions = True):
+            item = items.popleft()
+            error = isinstance(out, Exception)
+            if error or isinstance(item, dict):
+                item = dict(item) if isinstance(item, dict) else {}
+                item.pop("data", None)
+                item["error" if error else "data"] = str(out) if error else out
+                out = item
+            outfile.write(json.dumps(out, ensure_ascii = False).encode("utf-8") + b"\n")
+
+    try:
+        if o.batch and o.encode:
+            batch(d.encode_many)
+        elif o.batch:
+            batch(lambda messages, **kw: d.decode_many(messages, o.output_format or "str", **kw))
+        elif o.frames and o.encode:
+            texts = d.encodeframes(convertchunks(readchunks(source), o.input_format), o.frame_size, workers = o.workers)
+            write(("\n\n" if i else "") + text for i, text in enumerate(texts))
+        elif o.frames:
+            frames = d.decodeframes(paragraphs(readchunks(source)), workers = o.workers, return_exceptions = True)
+            try:
+                write(d.joinframes(frames), o.output_format)
+            except Exception as e:
+                # missing or corrupted frames, which the error names to send again
+                abort(e)
+        elif o.encode:
+            write(d.iterencode(convertchunks(readchunks(source), o.input_format)))
+        elif o.decode:
+            write(d.iterdecode(source), o.output_format)
+        elif o.encrypt:
+            write(d.iterencrypt(o.password, convertchunks(readchunks(source), o.input_format)))
+        elif o.decrypt:
+            try:
+                write(d.iterdecrypt(o.password, source), o.output_format)
+            except Exception as e:
+                # a wrong password or damaged data, not a bug to show a traceback for
+                abort(e)
+    finally:
+        if source is not infile:
+            try:
+                source.close()
+            except BufferError:
+                # still exported by the chunks of an aborted run
+                pass
+        if infile is not sys.stdin.buffer:
+            infile.close()
+        if outfile is not sys.stdout.buffer:
+            outfile.close()
+        if o.stats:
+            print(json.dumps(d.stats(), indent = 2), file = sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import asyncio
+import itertools
+from base64 import b64encode, b64decode
+from . import pydayada
+from .pydayada import dayada, initworker
+
+ops = ("encode", "decode", "encrypt", "decrypt")
+# payloads of up to this many characters are converted in the event loop, larger ones
+# and all encryption, which derives a key first, on the worker pool
+inline_max = 4096
+# the requests of a connection in progress at most; the next ones are left unread
+# until one is answered
+max_pending = 64
+# the longest request line read, in bytes
+line_max = 1 << 26
+
+def convert(d, item):
+    # the result of a request: data in the format given, "str" by default, for
+    # encode and encrypt, and asked for in that format from decode and decrypt
+    op = item.get("op")
+    data = item.get("data")
+    if op not in ops:
+        raise Exception("Unknown op {}".format(op))
+    if not isinstance(data, str):
+        raise Exception("The data must be a JSON string")
+    lang = item.get("lang")
+    format = item.get("format", "str")
+    if op in ("decode", "decrypt") and format not in ("str", "base64", "hex"):
+        raise Exception("Results are str, base64 or hex")
+    if op == "encode":
+        return d.encode(d.morph(data, format, "bytes"), lang = lang, format = "bytes", compression = item.get("compression"))
+    if op == "decode":
+        return d.decode(data, format, lang = lang)
+    pwd = item.get("password")
+    if not isinstance(pwd, str):
+        raise Exception("Encryption and decryption require a password")
+    if op == "encrypt":
+        return d.encrypt(pwd, d.morph(data, format, "bytes"), lang, item.get("compression"))
+    return d.morph(d.decrypt(pwd, data, lang), "bytes", format)
+
+def pooled(item):
+    return convert(pydayada.worker, item)
+
+class server:
+    # answers JSON Lines requests, {"id": ..., "op": ..., "data": ...} with lang,
+    # format, password and compression as needed, with {"id": ..., "data": ...} or
+    # {"id": ..., "error": ...}. Requests are answered as they are done, so the
+    # answers to pipelined requests can come in any order
+    def __init__(self, d, workers = None, inline_max = inline_max, max_pending = max_pending):
+        self.d = d
+        self.inline_max = inline_max
+        self.max_pending = max_pending
+        self.pool = None
+        if workers != 0:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # workers are started as they are needed; forked ones would hold on to the
+            # sockets of the connections open at the time, which then never close
+            context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None)
+            self.pool = ProcessPoolExecutor(workers or os.cpu_count() or 1, context, initializer = initworker, initargs = (d.langs, d.lang, d.marker, d.puncts, d.compression, d.seed))
+
+    async def run(self, item):
+        if self.pool is None or not isinstance(item, dict) or isinstance(item.get("data"), str) and len(item["data"]) <= self.inline_max and item.get("op") in ("encode", "decode"):
+            return convert(self.d, item)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, pooled, item)
+
+    async def respond(self, line, writer, lock):
+        item = None
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise Exception("Requests are JSON objects")
+            answer = {"id": item.get("id"), "data": await self.run(item)}
+        except Exception as e:
+            answer = {"id": item.get("id") if isinstance(item, dict) else None, "error": str(e)}
+        async with lock:
+            writer.write(json.dumps(answer, ensure_ascii = False).encode("utf-8") + b"\n")
+            # a client that doesn't read its answers stops the connection here
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        pending = asyncio.Semaphore(self.max_pending)
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                await pending.acquire()
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    line = None
+                if not line:
+                    break
+                if not line.strip():
+                    pending.release()
+                    continue
+                task = asyncio.ensure_future(self.respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda t: pending.release())
+            if line is None:
+                async with lock:
+                    writer.write(json.dumps({"id": None, "error": "Request longer than {} bytes".format(line_max)}).encode() + b"\n")
+            await asyncio.gather(*tasks, return_exceptions = True)
+        finally:
+            writer.close()
+
+    async def start(self, unix = None, host = "127.0.0.1", port = None):
+        if unix is not None:
+            return await asyncio.start_unix_server(self.handle, unix, limit = line_max)
+        return await asyncio.start_server(self.handle, host, port, limit = line_max)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures = True)
+
+class client:
+    # an asyncio client of a server, which can be awaited from many tasks at once:
+    # their requests are pipelined on the one connection
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.ids = itertools.count()
+        self.waiting = {}
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    async def receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                answer = json.loads(line)
+                future = self.waiting.pop(answer.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in answer:
+                    future.set_exception(Exception(answer["error"]))
+                else:
+                    future.set_result(answer["data"])
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(Exception("The connection to the server was closed"))
+            self.waiting.clear()
+
+    async def request(self, op, data, **fields):
+        if self.receiver.done():
+            raise Exception("The connection to the server was closed")
+        id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[id] = future
+        item = dict(fields, id = id, op = op, data = data)
+        async with self.lock:
+            self.writer.write(json.dumps(item, ensure_ascii = False).encode("utf-8") + b"\n")
+            await self.writer.drain()
+        return await future
+
+    async def send(self, op, data, format, lang, **fields):
+        # bytes travel as base64 both ways, str as it is. Fields left at None are
+        # left to the server's settings
+        if format is None:
+            format = "str" if isinstance(data, str) else "bytes"
+        if not isinstance(data, str) and format == "bytes":
+            data = b64encode(data).decode()
+        fields = {k: v for k, v in dict(fields, lang = lang).items() if v is not None}
+        out = await self.request(op, data, format = "base64" if format == "bytes" else format, **fields)
+        return b64decode(out) if op in ("decode", "decrypt") and format == "bytes" else out
+
+    async def encode(self, data, lang = None, compression = None):
+        return await self.send("encode", data, None, lang, compression = compression)
+
+    async def encrypt(self, pwd, data, lang = None, compression = None):
+        return await self.send("encrypt", data, None, lang, password = pwd, compression = compression)
+
+    async def decode(self, text, format = "bytes", lang = None):
+        return await self.send("decode", text, format, lang)
+
+    async def decrypt(self, pwd, text, format = "bytes", lang = None):
+        return await self.send("decrypt", text, format, lang, password = pwd)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        await asyncio.gather(self.receiver, return_exceptions = True)
+
+async def connect(unix = None, host = "127.0.0.1", port = None):
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix, limit = line_max)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit = line_max)
+    return client(reader, writer)
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(prog = "pydayada serve")
+    where = parser.add_mutually_exclusive_group(required = True)
+    where.add_argument('--unix') # the path of the socket
+    where.add_argument('--port', type=int)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('-l', '--language', default="en")
+    parser.add_argument('-L', '--langs', action='append') # a language file or directory, can be repeated
+    parser.add_argument('-s', '--seed')
+    parser.add_argument('-z', '--compress', action='store_true') # the same as --compression auto
+    parser.add_argument('--compression', choices=['none', 'zlib', 'bz2', 'lzma', 'auto'])
+    parser.add_argument('-w', '--workers', type=int) # 0 converts everything in the event loop
+    parser.add_argument('--inline-max', type=int, default=inline_max)
+    parser.add_argument('--max-pending', type=int, default=max_pending)
+    o = parser.parse_args(argv)
+
+    d = dayada()
+    for path in o.langs or []:
+        d.load_langs(path)
+    if o.language not in d.get_langs() and o.language != "auto":
+        print("Unknown language", o.language, file = sys.stderr)
+        return 1
+    d.set_lang(o.language)
+    d.set_seed(o.seed)
+    d.set_compression(o.compression or ("auto" if o.compress else None))
+    s = server(d, o.workers, o.inline_max, o.max_pending)
+
+    async def run():
+        listener = await s.start(o.unix, o.host, o.port)
+        print("Listening on", o.unix or "{}:{}".format(o.host, o.port), file = sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s.close()
+        if o.unix is not None and os.path.exists(o.unix):
+            os.unlink(o.unix)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
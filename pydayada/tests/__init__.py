@@ -4,12 +4,29 @@ from os import path
 project_root = path.join(path.abspath(__file__), '..', '..', '..')
 sys.path.append(path.normpath(project_root))
 
+import io
+import mmap
+import base64
+import os
+import json
+import tempfile
+import textwrap
 import random
+import asyncio
+import threading
 import unittest
-from pydayada import dayada
+from pydayada import dayada, bench, serve
+from pydayada.pydayada import aesgcm, convertchunks, compress, lrucache, encoder, npencoder, bitreader, scanner, langs, has_numpy
 
 text = "The quick brown fox jumped over the lazy dog's head"
-rand = random.randbytes(256)
+rand = random.Random(0).randbytes(256)
+# output of the original string-buffer encoder for text with random.seed(1)
+golden = {
+    "en": "Shayt vicair ostrays noot ucaignos osoun crouwinspeent ya dayada pranthayt obaeken foflimhous gleecait shurd ibon pitwhourd ejanren saent aigrushurd idoos wraeng.",
+    "jp": 'Yohiya su a yu mi, si kohi sina wike so e mi muwaru. Ya tayata kunse yuriwu ku, "Yo hinyuru sinkata te erunmi hoye." Ho wa u hahi taro mo una ue hunruse ru hahiya tu ka unhe.',
+    "it": 'Fosstri ucobra vorfrau froblo si, aspisplai ovo ita liano luma ufungu si ispi. Soddi plorfri si odu epli, "Ubride trespli si ovagni strausi ucli." Auscospi austestra claunvi utri.',
+    "hi": 'Liʻimōuwa lōwuhu wī mi hī, nī u kānē o ka maʻaina mamō nō. Kākawīluwu ʻi lānā wiʻao hā, "Kuwu ōkī ūpo he hī wū." Lī wā lēwenāo ʻu nānē mōkīpo kō lī hō.',
+}
 
 class TestLang(unittest.TestCase):
     def test_langs(self):
@@ -17,6 +34,171 @@ class TestLang(unittest.TestCase):
         for lang in d.get_langs():
           d.set_lang(lang)
 
+    def test_load_langs(self):
+        jp = {"consonants": ["", "K", "S", "T", "H", "M", "Y", "R", "W"], "matches": ["N"] * 9, "vowels": ["A", "I", "U", "E", "O"], "initials": [], "finals": [], "termination": "X", "syl_max_len": 3}
+        with tempfile.TemporaryDirectory() as tmp:
+          with open(path.join(tmp, "a.json"), "w") as f:
+            json.dump([dict(jp, name="ja", marker="JA JAJA"), dict(jp, name="jp", marker="YA TAYATA")], f)
+          with open(path.join(tmp, "b.toml"), "w") as f:
+            f.write('name = "jb"\nmarker = "JA BAJA"\n')
+            for k, v in jp.items():
+              f.write("{} = {}\n".format(k, json.dumps(v)))
+          with open(path.join(tmp, "c.txt"), "w") as f:
+            f.write("ignored")
+          cache = path.join(tmp, "cache")
+          for i in range(2):
+            d = dayada()
+            # a umask that leaves directories group-writable doesn't keep the cache off
+            umask = os.umask(0o002)
+            try:
+              loaded = d.load_langs(tmp, cache=cache)
+            finally:
+              os.umask(umask)
+            self.assertEqual(["ja", "jp", "jb"], [l.name for l in loaded])
+            self.assertEqual(["en", "it", "hi", "ja", "jp", "jb"], d.get_langs())
+            self.assertEqual(2, len(os.listdir(cache)))
+            for lang in ("ja", "jb"):
+              o = d.encode(text, lang=lang)
+              self.assertEqual(lang, d.guess_lang(o).name)
+              self.assertEqual(text, d.decode(o, "str"))
+          if hasattr(os, "getuid"):
+            # a cache others can write to is neither read nor written
+            os.chmod(cache, 0o777)
+            for n in os.listdir(cache):
+              os.remove(path.join(cache, n))
+            self.assertEqual(3, len(dayada().load_langs(tmp, cache=cache)))
+            self.assertEqual([], os.listdir(cache))
+          with open(path.join(tmp, "a.json"), "w") as f:
+            f.write('{"name": "bad", "marker": "BA BA", "vowels": "AIUEO"}')
+          self.assertRaises(Exception, d.load_langs, tmp, False)
+
+    def test_rank_langs(self):
+        d = dayada()
+        for lang in d.get_langs():
+          o = d.encode(text, lang=lang)
+          self.assertEqual(lang, d.guess_lang(o).name)
+          ranked = d.rank_langs(o)
+          self.assertEqual((lang, 1.0), (ranked[0][0].name, ranked[0][1]))
+          self.assertTrue(all(c < 1 for l, c in ranked[1:]))
+        d.set_marker(False)
+        for lang in d.get_langs():
+          o = d.encode(rand, lang=lang)
+          self.assertIsNone(d.guess_lang(o))
+          self.assertEqual(lang, d.rank_langs(o)[0][0].name)
+
+    def test_syllable_tables(self):
+        d = dayada()
+        for l in d.langs:
+          self.assertEqual(l.max_syl, len(set(l.syllables)))
+          for num, syl in enumerate(l.syllables):
+            core, add = l.codes[num]
+            self.assertEqual(num, core + max(add, 0) * l.exp2_syl)
+            self.assertTrue(syl.startswith(l.consonants[num % l.consonants_len]))
+          self.assertRaises(AttributeError, setattr, l, "marker", "")
+
+class TestDensity(unittest.TestCase):
+    def test_analyze(self):
+        d = dayada()
+        stats = d.analyze(measure=20000)
+        self.assertEqual(sorted(d.get_langs()), sorted(x.lang for x in stats))
+        self.assertEqual(sorted(x.utf8 for x in stats), [x.utf8 for x in stats])
+        for x in stats:
+          self.assertAlmostEqual(x.chars, x.measured_chars, delta=x.chars * .02)
+          self.assertAlmostEqual(x.utf8, x.measured_utf8, delta=x.utf8 * .02)
+          self.assertEqual(x.lang != "hi", x.ascii)
+        self.assertIsNone(d.analyze(measure=0)[0].measured_chars)
+
+    def test_auto_lang(self):
+        d = dayada()
+        best = d.analyze(measure=0)[0].lang
+        self.assertEqual(best, d.densest_lang().name)
+        o = d.encode(text, lang="auto")
+        self.assertEqual(best, d.guess_lang(o).name)
+        self.assertEqual(text, d.decode(o, "str"))
+        for l in (d.densest_lang(ascii=True), d.densest_lang(max_word=10)):
+          self.assertTrue(l.allchars.isascii())
+        d.set_auto_lang(max_word=10)
+        d.set_lang("auto")
+        o = d.encode(text)
+        self.assertTrue(all(len(w.strip(',."')) <= 10 for w in o.split()))
+        self.assertRaises(Exception, d.densest_lang, max_word=2)
+
+class TestPredict(unittest.TestCase):
+    def test_predict(self):
+        d = dayada()
+        r = random.Random(3)
+        payloads = [b"", b"\x40", text.encode()] + [r.randbytes(r.randint(1, 300)) for i in range(20)] + [r.randbytes(20000)]
+        for l in d.get_langs():
+          for data in payloads:
+            p = d.predict(data, lang=l)
+            o = d.encode(data, lang=l, format="bytes")
+            self.assertEqual(p.words, len(o.split()))
+            self.assertTrue(p.min_chars <= len(o) <= p.max_chars)
+            self.assertTrue(p.min_utf8 <= len(o.encode()) <= p.max_utf8)
+        d.set_seed(7)
+        d.set_marker(False)
+        d.set_puncts([[4, ", ", 6, ". "], [3, "! "]])
+        for l in d.get_langs():
+          for data in payloads:
+            p = d.predict(data, lang=l, compression="zlib")
+            o = d.encode(data, lang=l, format="bytes", compression="zlib")
+            self.assertEqual((len(o), len(o), len(o.encode()), len(o.encode())), p[1:])
+
+    def test_engines(self):
+        if not has_numpy:
+          self.skipTest("numpy is not installed")
+        d = dayada()
+        data = random.Random(4).randbytes(30000)
+        for l in d.get_langs():
+          d.set_engine("numpy")
+          p = d.predict(data, lang=l)
+          d.set_engine("python")
+          self.assertEqual(p, d.predict(data, lang=l))
+
+    def test_split(self):
+        d = dayada()
+        data = random.Random(5).randbytes(700)
+        for seed in (None, 1):
+          d.set_seed(seed)
+          for l in d.get_langs():
+            texts = d.split(data, lang=l)
+            limit = 70 if l == "hi" else 160
+            self.assertTrue(all(len(t) <= limit for t in texts))
+            self.assertEqual(data, b"".join(d.decode(t, "bytes") for t in texts))
+        texts = d.split(data, 400, "en")
+        self.assertTrue(all(len(t) <= 400 for t in texts))
+        self.assertEqual(data, b"".join(d.decode(t, "bytes") for t in texts))
+        self.assertEqual(1, len(d.split(b"")))
+        self.assertRaises(Exception, d.split, data, 10)
+
+class TestGenerate(unittest.TestCase):
+    def test_words(self):
+        d = dayada()
+        for engine in ["python"] + (["numpy"] if has_numpy else []):
+          d.set_engine(engine)
+          for l in langs:
+            words = list(d.generate_words(l.name, 2000, seed=1))
+            self.assertEqual(2000, len(words))
+            self.assertEqual(words, list(d.generate_words(l.name, 2000, seed=1)))
+            self.assertTrue(all(w and w == w.lower() for w in words))
+            # one syllable words are an initial or none, a syllable and a final or none
+            short = set(i + s + f for i in [""] + list(l.initials) for s in l.syllables for f in list(l.finals) or [""])
+            self.assertTrue(set(w.upper() for w in d.generate_words(l.name, 500, 1, 1)) <= short)
+            unique = list(d.generate_words(l.name, 3000, 1, 2, unique=True))
+            self.assertEqual(3000, len(set(unique)))
+          self.assertEqual(45, len(set(d.generate_words("jp", 45, 1, 1, unique=True))))
+          self.assertRaises(Exception, d.generate_words, "jp", 46, 1, 1, unique=True)
+          self.assertRaises(Exception, d.generate_words, "en", 1, 3, 2)
+
+    def test_text(self):
+        d = dayada()
+        o = "".join(d.generate_text("it", 50, seed=2))
+        self.assertEqual(o, "".join(d.generate_text("it", 50, seed=2)))
+        self.assertEqual(50, len(o.split()))
+        self.assertTrue(o[0].isupper() and o.rstrip().endswith((".", '."')))
+        self.assertIsNone(d.guess_lang(o))
+        self.assertEqual([], list(d.generate_text("it", 0)))
+
 class TestMorph(unittest.TestCase):
     def test_morph_str_str(self):
         d = dayada()
@@ -38,6 +220,18 @@ class TestMorph(unittest.TestCase):
         o = d.morph(text, "str", "bytes")
         self.assertEqual(str.encode(text), o)
 
+    def test_morph_zero_copy(self):
+        d = dayada()
+        with tempfile.TemporaryFile() as f:
+          f.write(b"\x00\xff" * 100)
+          f.flush()
+          m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+          for data in (bytearray(b"\x00\xff"), memoryview(b"\x00\xff"), m):
+            self.assertIs(data, d.morph(data, "bytes", "bytes"))
+          self.assertEqual("00ff" * 100, d.morph(m, "bytes", "hex"))
+          self.assertEqual(b"\x00\xff" * 100, d.decode(d.encode(m, format="bytes"), "bytes"))
+          m.close()
+
     def test_morph_hex_str(self):
         d = dayada()
         o = d.morph("54686520717569636b2062726f776e20666f78206a756d706564206f76657220746865206c617a7920646f6727732068656164", "hex", "str")
@@ -68,6 +262,81 @@ class TestEncoding(unittest.TestCase):
           i = d.decode(o, 'str')
           self.assertEqual(text, i)
 
+    def test_encode_golden(self):
+        d = dayada()
+        d.set_shared_random()
+        for lang in d.get_langs():
+          d.set_lang(lang)
+          random.seed(1)
+          self.assertEqual(golden[lang], d.encode(text))
+
+    def test_own_random(self):
+        d = dayada()
+        random.seed(1)
+        r = random.random()
+        random.seed(1)
+        d.encode(text)
+        self.assertEqual(r, random.random())
+
+    def test_set_puncts(self):
+        d = dayada()
+        d.set_puncts([[2, "! "], [1, "; ", 3, "? "]])
+        o = d.encode(text)
+        self.assertTrue(o.endswith("."))
+        self.assertEqual(0, o.count(","))
+        for sep in ("! ", "? "):
+          for part in o.split(sep)[1:]:
+            self.assertTrue(part[0].isupper())
+        self.assertEqual(text, d.decode(o, "str"))
+        self.assertRaises(Exception, d.set_puncts, [[", "]])
+        self.assertRaises(Exception, d.set_puncts, [[2, 3.5]])
+        self.assertRaises(Exception, d.set_puncts, [])
+        # templates whose text doesn't decode back
+        d.set_seed(1)
+        for puncts in ([[3, " - "]], [[3, ","]], [[3, "!"], [2, ". "]], [[0, ". ", 2, ". "]], [[3, " and "]], [[3, ". ", ", "]]):
+          self.assertRaises(Exception, d.set_puncts, puncts)
+          d.puncts = puncts
+          try:
+            o = d.decode(d.encode(text), "bytes")
+          except Exception:
+            o = None
+          self.assertNotEqual(text.encode(), o)
+
+    def test_encodehex_encodebytes(self):
+        d = dayada()
+        d.set_marker(False)
+        d.set_shared_random()
+        for h in ["", "a", "5f", "abc", rand.hex()]:
+          random.seed(1)
+          o = d.encodehex(h)
+          random.seed(1)
+          i = d.encodebytes(bytes.fromhex(h + "0" * (len(h) % 2)))
+          if len(h) % 2 == 0:
+            self.assertEqual(o, i)
+          else:
+            self.assertNotEqual(o, i)
+
+    def test_decodehex_decodebytes(self):
+        d = dayada()
+        for lang in d.get_langs():
+          d.set_lang(lang)
+          o = d.encode(rand)
+          self.assertEqual(rand.hex(), d.decodehex(o))
+          i = d.decodebytes(o)
+          self.assertIsInstance(i, bytearray)
+          self.assertEqual(rand, i)
+
+    def test_last_nibble(self):
+        # data ending in a nibble of one bit value, right where the padding starts
+        d = dayada()
+        r = random.Random(11)
+        payloads = [bytes([i]) for i in range(256)] + [r.randbytes(r.randint(1, 40)) for i in range(500)]
+        for lang in d.get_langs():
+          for data in payloads:
+            self.assertEqual(data, d.decode(d.encode(data, lang=lang), "bytes"))
+          for h in ("f", "0", "a0", "abcf"):
+            self.assertEqual(h, d.decodehex(d.encodehex(h, lang=lang)))
+
     def test_encode_decode_difflang(self):
         d = dayada()
         langs = random.choices(d.get_langs(), k=2)
@@ -90,6 +359,455 @@ class TestEncoding(unittest.TestCase):
           i = d.decode(o, 'bytes')
           self.assertEqual(rand, i)
 
+class TestTrace(unittest.TestCase):
+    def test_trace_off(self):
+        d = dayada()
+        o = d.encode(text)
+        d.decode(o)
+        self.assertEqual("", d.get_assembly())
+
+    def test_trace_encode_decode(self):
+        d = dayada()
+        bits = "".join(format(b, "08b") for b in text.encode())
+        enc = []
+        o = d.encode(text, trace=enc)
+        self.assertTrue("".join(e.bits for e in enc).startswith(bits))
+        self.assertEqual(list(range(enc[-1].syllable + 1)), sorted(set(e.syllable for e in enc)))
+        dec = []
+        d.set_trace(dec.append)
+        d.decode(o)
+        self.assertTrue("".join(e.bits for e in dec).startswith(bits))
+        self.assertEqual([e.offset for e in dec], [len("".join(e.bits for e in dec[:i])) for i in range(len(dec))])
+        self.assertEqual("", d.get_assembly())
+        self.assertTrue(d.get_assembly(dec).startswith(dec[0].bits + " " + dec[0].part + " "))
+
+class TestStreaming(unittest.TestCase):
+    def test_iterencode_golden(self):
+        d = dayada()
+        d.set_shared_random()
+        for lang in d.get_langs():
+          d.set_lang(lang)
+          random.seed(1)
+          self.assertEqual(golden[lang], "".join(d.iterencode([text[:10], text[10:]])))
+
+    def test_iterdecode(self):
+        d = dayada()
+        for lang in d.get_langs():
+          d.set_lang(lang)
+          o = d.encode(rand)
+          d.set_lang(lang)
+          self.assertEqual(rand, b"".join(d.iterdecode(o[i:i + 7] for i in range(0, len(o), 7))))
+
+    def test_iterencode_iterdecode_files(self):
+        d = dayada()
+        data = random.Random(0).randbytes(20000)
+        for lang in d.get_langs():
+          d.set_lang(lang)
+          o = "".join(d.iterencode(io.BytesIO(data), chunk_size=1000))
+          d.set_lang(lang)
+          i = b"".join(d.iterdecode(io.BytesIO(o.encode("utf-8")), chunk_size=333))
+          self.assertEqual(data, i)
+
+    def test_iterdecode_encode_file(self):
+        # encode() output far longer than the window the language is guessed from
+        d = dayada()
+        data = random.Random(9).randbytes(60000)
+        for lang in ("it", "jp"):
+          d.set_lang(lang)
+          o = d.encode(data)
+          self.assertGreater(len(o), 150000)
+          d.set_lang("en")
+          with tempfile.TemporaryFile() as f:
+            f.write(o.encode("utf-8"))
+            f.seek(0)
+            self.assertEqual(data, b"".join(d.iterdecode(f)))
+
+    def test_iterencode_memoryview(self):
+        d = dayada()
+        data = random.Random(1).randbytes(5000)
+        o = "".join(d.iterencode(memoryview(data), chunk_size=700))
+        self.assertEqual(data, d.decode(o, "bytes"))
+
+    def test_convertchunks(self):
+        data = random.Random(2).randbytes(3000)
+        h = data.hex().encode("ascii")
+        self.assertEqual(data, b"".join(convertchunks((h[i:i + 33] + b"\n" for i in range(0, len(h), 33)), "hex")))
+        b = base64.encodebytes(data)
+        self.assertEqual(data, b"".join(convertchunks((b[i:i + 101] for i in range(0, len(b), 101)), "base64")))
+        self.assertRaises(Exception, b"".join, convertchunks([b"abc"], "hex"))
+
+@unittest.skipUnless(has_numpy, "numpy is not installed")
+class TestNumpy(unittest.TestCase):
+    def test_same_words(self):
+        r = random.Random(7)
+        for l in langs:
+          for data in (b"", r.randbytes(3), r.randbytes(6000), bytes(3000), b"\xff" * 3000):
+            for nbits in (None, max(8 * len(data) - 4, 0)):
+              e = npencoder(l, [data], nbits)
+              e.block = 1 << 12
+              e.min_bits = 64
+              p = encoder(l, bitreader(data, nbits))
+              self.assertEqual(list(p.words()), list(e.words()))
+              self.assertEqual(p.partial, e.partial)
+
+    def test_engines(self):
+        d = dayada()
+        data = random.Random(8).randbytes(20000)
+        out = {}
+        d.set_shared_random()
+        for engine in ("python", "numpy"):
+          d.set_engine(engine)
+          random.seed(1)
+          out[engine] = (d.encode(data), "".join(d.iterencode(data, chunk_size=999)))
+        self.assertEqual(out["python"], out["numpy"])
+        self.assertEqual(data, d.decode(out["numpy"][0], "bytes"))
+        self.assertRaises(Exception, d.set_engine, "fortran")
+
+class TestThreading(unittest.TestCase):
+    def test_per_call_lang(self):
+        d = dayada()
+        d.set_lang("jp")
+        o = d.encode(text, lang="it")
+        self.assertEqual("jp", d.lang.name)
+        self.assertEqual(text, d.decode(o, "str", lang="jp"))
+        self.assertRaises(Exception, d.encode, text, lang="xx")
+
+    def test_shared_instance(self):
+        d = dayada()
+        data = random.Random(0).randbytes(2000)
+        results = {}
+        def work(lang):
+          o = d.encode(data, lang=lang)
+          results[lang] = d.decode(o, "bytes", lang=lang)
+        threads = [threading.Thread(target=work, args=(lang,)) for lang in d.get_langs()]
+        for t in threads:
+          t.start()
+        for t in threads:
+          t.join()
+        self.assertEqual({lang: data for lang in d.get_langs()}, results)
+
+class TestCache(unittest.TestCase):
+    def test_seed(self):
+        d = dayada()
+        d.set_seed(42)
+        o = d.encode(text)
+        random.seed(0)
+        d.encode(b"something else")
+        self.assertEqual(o, d.encode(text))
+        e = dayada()
+        e.set_seed(42)
+        self.assertEqual(o, e.encode(text))
+        self.assertEqual([o] * 3, list(e.encode_many([text] * 3, workers=2)))
+        e.set_seed(43)
+        self.assertNotEqual(o, e.encode(text))
+        self.assertRaises(Exception, e.set_seed, 1.5)
+
+    def test_cache(self):
+        d = dayada()
+        d.set_cache(100000)
+        o = d.encode(text)
+        self.assertEqual(0, d.cache.stats()["misses"])
+        d.set_seed(1)
+        o = d.encode(text)
+        self.assertEqual(o, d.encode(text))
+        self.assertEqual(text, d.decode(o, "str"))
+        self.assertEqual(text, d.decode(o, "str"))
+        self.assertEqual(text.encode(), d.decode(o, "bytes"))
+        stats = d.cache.stats()
+        self.assertEqual((2, 3, 3), (stats["hits"], stats["misses"], stats["entries"]))
+        d.set_marker(False)
+        self.assertEqual(0, d.cache.stats()["entries"])
+        self.assertNotEqual(o, d.encode(text))
+
+    def test_eviction(self):
+        c = lrucache(100)
+        c.put("a", "x" * 10, 40)
+        c.put("b", "y" * 10, 40)
+        c.get("a")
+        c.put("c", "z" * 10, 40)
+        self.assertEqual((None, "x" * 10), (c.get("b"), c.get("a")))
+        c.put("d", "too big", 101)
+        self.assertIsNone(c.get("d"))
+        self.assertEqual(80, c.stats()["bytes"])
+
+class TestStats(unittest.TestCase):
+    def test_records(self):
+        d = dayada()
+        records = []
+        d.set_metrics(records.append)
+        data = random.Random(7).randbytes(1000)
+        o = d.encode(data, lang="it")
+        self.assertEqual(data, d.decode(o, "bytes"))
+        self.assertEqual(["encode", "decode"], [r["op"] for r in records])
+        enc, dec = records
+        self.assertEqual(("it", 1000, len(o)), (enc["lang"], enc["input_size"], enc["output_size"]))
+        self.assertEqual((len(o), 1000), (dec["input_size"], dec["output_size"]))
+        for k in ("syllables", "words", "bits"):
+          self.assertEqual(enc[k], dec[k])
+        self.assertEqual(8000, enc["bits"])
+        self.assertTrue(0 < enc["padding_bits"] <= 22)
+        self.assertTrue({"morph", "words", "format"} <= set(enc["stages"]))
+        self.assertTrue({"guess_lang", "decode", "decompress"} <= set(dec["stages"]))
+        self.assertAlmostEqual(enc["seconds"], sum(enc["stages"].values()))
+        self.assertRaises(Exception, d.stats)
+
+    def test_engines(self):
+        # both encoders count alike
+        data = random.Random(8).randbytes(20000)
+        lang = dayada().get_lang("en")
+        counts = []
+        for enc in (encoder(lang, bitreader(data)), npencoder(lang, [data], len(data) * 8)):
+          list(enc.words())
+          counts.append(enc.counts())
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stats(self):
+        d = dayada()
+        d.set_stats()
+        d.set_cache(100000)
+        d.set_seed(1)
+        o = d.encode(text)
+        d.encode(text)
+        d.encodehex("abc")
+        self.assertEqual(text.encode(), b"".join(d.iterdecode(io.StringIO(o), chunk_size=10)))
+        stats = d.stats()
+        self.assertEqual({"encode", "decode"}, set(stats))
+        self.assertEqual((3, 1), (stats["encode"]["calls"], stats["encode"]["cache_hits"]))
+        self.assertEqual(2 * len(text) + 2, stats["encode"]["input_size"])
+        self.assertEqual((1, len(o), len(text)), (stats["decode"]["calls"], stats["decode"]["input_size"], stats["decode"]["output_size"]))
+        self.assertTrue(stats["decode"]["stages"]["read"] > 0)
+        d.set_stats(False)
+        self.assertRaises(Exception, d.stats)
+
+class TestBatch(unittest.TestCase):
+    def test_encode_decode_many(self):
+        d = dayada()
+        msgs = [text[:i] for i in range(5, len(text), 4)]
+        for workers in (0, 2):
+          o = list(d.encode_many(msgs, lang="it", workers=workers, chunksize=3))
+          self.assertEqual(len(msgs), len(o))
+          self.assertEqual(["it"] * len(msgs), [d.guess_lang(t).name for t in o])
+          self.assertEqual(msgs, list(d.decode_many(o, "str", workers=workers, chunksize=3)))
+
+    def test_return_exceptions(self):
+        d = dayada()
+        o = [d.encode(text), "Aa aa.", d.encode(text)]
+        i = list(d.decode_many(o, "str", workers=2, chunksize=1, return_exceptions=True))
+        self.assertEqual(text, i[0])
+        self.assertIsInstance(i[1], Exception)
+        self.assertEqual(text, i[2])
+        self.assertRaises(Exception, list, d.decode_many(o, "str", workers=0))
+
+class TestCompression(unittest.TestCase):
+    def test_encode_decode(self):
+        d = dayada()
+        data = text.encode() * 50
+        plain = d.encode(data)
+        for codec in ("zlib", "bz2", "lzma", "auto"):
+          o = d.encode(data, compression=codec)
+          self.assertLess(len(o), len(plain) / 4)
+          self.assertEqual(data, d.decode(o, "bytes"))
+          self.assertEqual(data, b"".join(d.iterdecode([o])))
+          o = "".join(d.iterencode([data[:100], data[100:]], compression=codec))
+          self.assertEqual(data, d.decode(o, "bytes"))
+
+    def test_auto_skips(self):
+        d = dayada()
+        d.set_compression("auto")
+        for data in (b"tiny", random.Random(6).randbytes(3000)):
+          o = d.encode(data)
+          self.assertEqual(data, bytes(d.decodebytes(o)))
+          self.assertEqual(data, d.decode(d.encode(data, compression="none"), "bytes"))
+        self.assertRaises(Exception, d.set_compression, "zip")
+
+    def test_look_alike(self):
+        # data that only looks compressed is compressed when encoded, so decode() and
+        # iterdecode() agree on it, as they do on text of it written as it is
+        d = dayada()
+        for codec in ("zlib", "bz2", "lzma"):
+          data = compress(b"x" * 100, codec)[:-1]
+          for compression in ("none", "auto"):
+            for o in (d.encode(data, compression=compression), "".join(d.iterencode([data], compression=compression))):
+              self.assertEqual(data, d.decode(o, "bytes"))
+              self.assertEqual(data, b"".join(d.iterdecode([o])))
+          o = d.encodebytes(data)
+          self.assertRaises(Exception, d.decode, o, "bytes")
+          self.assertRaises(Exception, b"".join, d.iterdecode([o]))
+
+    def test_encode_many(self):
+        d = dayada()
+        d.set_compression("zlib")
+        msgs = [text.encode() * i for i in range(1, 6)]
+        o = list(d.encode_many(msgs, workers=2))
+        self.assertTrue(all(bytes(d.decodebytes(t))[:1] == b"\xd1" for t in o))
+        self.assertEqual(msgs, list(d.decode_many(o, "bytes", workers=0)))
+
+class TestFrames(unittest.TestCase):
+    def test_encode_decode_frames(self):
+        d = dayada()
+        data = random.Random(3).randbytes(10000)
+        o = list(d.encodeframes(data, 1000, lang="it", workers=0))
+        self.assertEqual(10, len(o))
+        self.assertEqual(data, b"".join(d.joinframes(d.decodeframes("\n\n".join(o), workers=2))))
+        random.Random(0).shuffle(o)
+        self.assertEqual(data, b"".join(d.joinframes(d.decodeframes(o, workers=0))))
+        self.assertEqual(b"", b"".join(d.joinframes(d.decodeframes(list(d.encodeframes(b"", workers=0)), workers=0))))
+
+    def test_many_frames(self):
+        # the languages without finals, where frames ending in a nibble of one bit
+        # value used to lose it to the padding
+        d = dayada()
+        data = random.Random(6).randbytes(60000)
+        for l in ("jp", "it", "hi"):
+          o = list(d.encodeframes(data, 200, lang=l, workers=0))
+          self.assertEqual(300, len(o))
+          self.assertEqual(data, b"".join(d.joinframes(d.decodeframes(o, workers=0))))
+
+    def test_corrupted_frames(self):
+        d = dayada()
+        data = random.Random(4).randbytes(5000)
+        o = list(d.encodeframes(data, 1000, workers=0))
+        words = o[2].split(" ")
+        o[2] = " ".join(words[:5] + words[6:])
+        f = list(d.decodeframes(o, workers=0, return_exceptions=True))
+        self.assertIsInstance(f[2], Exception)
+        self.assertEqual([0, 1, 3, 4], [x.seq for x in f if not isinstance(x, Exception)])
+        with self.assertRaisesRegex(Exception, "frames: 2$"):
+          b"".join(d.joinframes(f))
+        with self.assertRaisesRegex(Exception, "frames: 2, the last"):
+          b"".join(d.joinframes(f[:4]))
+
+    def test_frameindex(self):
+        d = dayada()
+        data = random.Random(5).randbytes(10000)
+        o = list(d.encodeframes(data, 1000, workers=0))
+        index = d.frameindex(o, frame_size=1000)
+        self.assertEqual(data[2500:4200], index.read(2500, 4200))
+        self.assertEqual([2, 3, 4], sorted(index.frames))
+        self.assertEqual(data[9990:], index.read(9990, 20000))
+        o.reverse()
+        self.assertEqual(data[:1500], d.frameindex("\n\n".join(o)).read(0, 1500))
+
+class TestScan(unittest.TestCase):
+    def document(self, d):
+        payloads = [(b"meet me at noon", "en"), (random.Random(9).randbytes(300), "jp"), (text.encode(), "it"), (b"x" * 3000, "hi")]
+        parts = ["Hi Bob,\n\nHere is the thing we talked about: "]
+        for data, lang in payloads:
+          parts.append(d.encode(data, lang=lang))
+          parts.append(" Best regards, see you on Monday at 10:30.\n\nAnother <b>note</b>. ")
+        return "".join(parts), payloads
+
+    def test_scan(self):
+        d = dayada()
+        doc, payloads = self.document(d)
+        found = list(d.scan(doc))
+        self.assertEqual(payloads, [(p.data, p.lang) for p in found])
+        for p in found:
+          self.assertEqual(p.data, d.decode(doc[p.start:p.end], "bytes"))
+        raw = doc.encode()
+        self.assertEqual(found, list(d.scan(io.BytesIO(raw), chunk_size=7)))
+        self.assertEqual(found[1:3], list(d.scan(doc, langs=["jp", "it"])))
+        self.assertEqual([], list(d.scan(text + ". " + text)))
+
+    def test_wrapped(self):
+        # mail wraps long lines, which the decoder would otherwise join words across
+        d = dayada()
+        payloads = [(random.Random(10).randbytes(200), "en"), (text.encode(), "jp")]
+        doc = "Hello Bob,\n\n" + "\n\nCheers.\n\n".join(textwrap.fill(d.encode(data, lang=lang), 72) for data, lang in payloads) + "\n"
+        self.assertEqual(payloads, [(p.data, p.lang) for p in d.scan(doc)])
+
+    def test_limits(self):
+        d = dayada()
+        doc, payloads = self.document(d)
+        found = list(scanner(d, max_chars=4000).scan([doc]))
+        self.assertEqual([p[0] for p in payloads[:3]] + [None], [p.data for p in found])
+        d.set_marker(False)
+        o = d.encode(b"unmarked")
+        self.assertEqual([], list(d.scan(o)))
+        self.assertEqual([b"unmarked"], [p.data for p in scanner(d, marker=False, min_words=2).scan([o])])
+
+    def test_scanfiles(self):
+        d = dayada()
+        doc, payloads = self.document(d)
+        with tempfile.TemporaryDirectory() as tmp:
+          paths = [path.join(tmp, name) for name in ("a", "b", "empty", "missing")]
+          for p, content in zip(paths, (doc, "Nothing. " + d.encode(text), "")):
+            with open(p, "w") as f:
+              f.write(content)
+          for workers in (0, 2):
+            found = list(d.scanfiles(paths, workers=workers, return_exceptions=True))
+            self.assertEqual([paths[0]] * 4 + [paths[1], paths[3]], [f[0] for f in found])
+            self.assertEqual(text.encode(), found[4][1].data)
+            self.assertIsInstance(found[5][1], Exception)
+
+class TestBench(unittest.TestCase):
+    def test_run_compare(self):
+        report = bench.run(["en"], (16, 256), ("random",), min_time=0, startup_runs=1)
+        ops = set(r["op"] for r in report["results"])
+        self.assertTrue({"encode", "decode", "iterencode", "iterdecode"} <= ops)
+        self.assertTrue(all(r["bytes_per_s"] > 0 and r["peak_bytes"] > 0 for r in report["results"]))
+        self.assertTrue(0 < report["startup"]["import_encode_s"] < report["startup"]["process_s"])
+        report["startup"]["target_s"] = report["startup"]["import_encode_s"] / 2
+        self.assertEqual(["startup"], [r["op"] for r in bench.compare(report)])
+        report["startup"]["target_s"] = report["startup"]["import_encode_s"] * 2
+        self.assertEqual([], bench.compare(report, report))
+        faster = {"results": [dict(r, bytes_per_s=r["bytes_per_s"] * 2) for r in report["results"]]}
+        regressions = bench.compare(report, faster)
+        self.assertEqual(len(report["results"]), len(regressions))
+        self.assertEqual({"bytes_per_s"}, set(r["field"] for r in regressions))
+
+class TestServe(unittest.TestCase):
+    def serve(self, test, **kw):
+        async def run():
+          with tempfile.TemporaryDirectory() as tmp:
+            sock = path.join(tmp, "socket")
+            s = serve.server(dayada(), **kw)
+            listener = await s.start(sock)
+            c = await serve.connect(sock)
+            try:
+              await test(c)
+            finally:
+              await c.close()
+              # lets the server see the end of the connection
+              await asyncio.sleep(.05)
+              listener.close()
+              await listener.wait_closed()
+              s.close()
+        asyncio.run(run())
+
+    def test_pipelining(self):
+        data = [random.Random(i).randbytes(n) for i, n in enumerate((5, 100, 6000, 30))]
+        async def test(c):
+          texts = await asyncio.gather(*[c.encode(x, lang="it") for x in data])
+          self.assertEqual(["it"] * 4, [dayada().guess_lang(t).name for t in texts])
+          self.assertEqual(data, await asyncio.gather(*[c.decode(t) for t in texts]))
+          self.assertEqual(text, await c.decode(await c.encode(text), "str"))
+          e = await c.encrypt("pw", text, compression="zlib")
+          self.assertEqual(text.encode(), await c.decrypt("pw", e))
+          with self.assertRaisesRegex(Exception, "Unknown op"):
+            await c.request("shred", "x")
+          with self.assertRaisesRegex(Exception, "Unknown language"):
+            await c.encode(b"x", lang="xx")
+        for workers in (0, 2):
+          self.serve(test, workers=workers, inline_max=1000)
+        self.serve(test, workers=0, max_pending=1)
+
+    def test_protocol(self):
+        async def test(c):
+          # what a client in any language would send, pipelined in a single write
+          lines = [{"id": "a", "op": "encode", "data": "68656c6c6f", "format": "hex"}, [], {"id": 7, "op": "decode", "data": d.encode(text), "format": "base64"}]
+          c.writer.write(b"".join(json.dumps(x).encode() + b"\n" for x in lines) + b"{\n")
+          c.receiver.cancel()
+          answers = {}
+          for i in range(4):
+            answer = json.loads(await c.reader.readline())
+            answers[answer["id"] if answer["id"] is not None else answer["error"][:8]] = answer
+          self.assertEqual("hello", d.decode(answers["a"]["data"], "str"))
+          self.assertEqual(text, base64.b64decode(answers[7]["data"]).decode())
+          self.assertEqual({"Requests", "Expectin"}, set(answers) - {"a", 7})
+        d = dayada()
+        self.serve(test, workers=0)
+
 class TestEncrypting(unittest.TestCase):
 
     def test_encrypt_decode_default(self):
@@ -106,5 +824,36 @@ class TestEncrypting(unittest.TestCase):
         i = d.decrypt(pwd, o)
         self.assertEqual(rand, i)
 
+    def test_iterencrypt_iterdecrypt(self):
+        d = dayada()
+        d.set_cipher(aesgcm(chunk_size=1000))
+        data = random.Random(0).randbytes(5000)
+        o = "".join(d.iterencrypt("pwd", io.BytesIO(data), chunk_size=777))
+        self.assertEqual(data, b"".join(d.iterdecrypt("pwd", io.StringIO(o), chunk_size=333)))
+        self.assertEqual(data, d.decrypt("pwd", o))
+        # a wrong password fails on the first chunk
+        out = d.iterdecrypt("wrong", [o])
+        self.assertRaises(Exception, next, out)
+
+    def test_compression(self):
+        d = dayada()
+        data = text.encode() * 50
+        o = d.encrypt("pw", data, compression="auto")
+        self.assertLess(len(o), len(d.encrypt("pw", data)) / 4)
+        self.assertEqual(data, d.decrypt("pw", o))
+        o = "".join(d.iterencrypt("pw", [data], compression="zlib"))
+        self.assertEqual(data, b"".join(d.iterdecrypt("pw", [o])))
+
+    def test_tampering(self):
+        c = aesgcm(chunk_size=100)
+        data = bytes(range(250))
+        sealed = c.encrypt("pwd", data)
+        self.assertEqual(c.header_len + 250 + 3 * c.tag_len, len(sealed))
+        self.assertEqual(data, c.decrypt("pwd", sealed))
+        frames = [sealed[c.header_len + i:c.header_len + i + 116] for i in range(0, 250 + 48, 116)]
+        self.assertRaises(Exception, c.decrypt, "pwd", sealed[:c.header_len] + frames[1] + frames[0] + frames[2])
+        self.assertRaises(Exception, c.decrypt, "pwd", sealed[:c.header_len] + frames[0] + frames[1])
+        self.assertRaises(Exception, c.decrypt, "pwd", sealed[:-1])
+
 if __name__ == '__main__':
     unittest.main()
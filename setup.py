@@ -14,5 +14,7 @@ setuptools.setup(
     url='https://github.com/mansxu/pydayada',
     packages=setuptools.find_packages(),
     entry_points={'console_scripts': ['pydayada = pydayada:main']},
-    install_requires=['pycryptodome', 'simplecrypto'],
+    install_requires=['pycryptodome'],
+    # only to decrypt texts encrypted by earlier versions
+    extras_require={'simplecrypto': ['simplecrypto']},
 )